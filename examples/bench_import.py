@@ -0,0 +1,64 @@
+"""
+Import time of the plugin (what napari pays at startup)
+
+every measurement runs in a fresh interpreter. The time of `import napari_particles`
+(plugin discovery) and the additional time of `import napari_particles.particles` on top
+of napari/vispy (which napari has already loaded) are compared against a budget.
+"""
+import sys
+import json
+import argparse
+import subprocess
+
+_SCRIPT = """
+import sys, json
+from time import perf_counter
+for name in {baseline!r}:
+    __import__(name)
+before = set(sys.modules)
+t = perf_counter()
+__import__({module!r})
+t = perf_counter() - t
+new = sorted(set(sys.modules) - before)
+print(json.dumps(dict(time=t, modules=new)))
+"""
+
+# modules that should only be loaded on first use
+HEAVY = ("scipy", "napari", "vispy", "numba", "pandas")
+
+
+def measure(module, baseline=(), repeats=5):
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", _SCRIPT.format(module=module, baseline=tuple(baseline))],
+            capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(out.stdout.splitlines()[-1]))
+    best = min(runs, key=lambda r: r["time"])
+    return best["time"], best["modules"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeats", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=50, help="budget for the additional import time of the layer module")
+    parser.add_argument("--plugin-budget-ms", type=float, default=5, help="budget for importing the (bare) plugin package")
+
+    args = parser.parse_args()
+
+    failed = False
+
+    t, modules = measure("napari_particles", repeats=args.repeats)
+    heavy = sorted({m.split(".")[0] for m in modules} & set(HEAVY))
+    print(f"import napari_particles              {1000 * t:8.1f} ms  (heavy modules: {', '.join(heavy) or 'none'})")
+    failed |= 1000 * t > args.plugin_budget_ms or len(heavy) > 0
+
+    t, modules = measure("napari_particles.particles", baseline=("napari.layers", "vispy.gloo"), repeats=args.repeats)
+    heavy = sorted({m.split(".")[0] for m in modules} & set(HEAVY) - {"napari", "vispy"})
+    print(f"import napari_particles.particles    {1000 * t:8.1f} ms  (on top of napari, new heavy modules: {', '.join(heavy) or 'none'})")
+    failed |= 1000 * t > args.budget_ms
+
+    if failed:
+        print("import time budget exceeded")
+        sys.exit(1)
@@ -0,0 +1,84 @@
+"""
+Memory locality of particles in file order vs. Morton (Z-curve) order
+
+localizations are usually stored in acquisition (frame) order, i.e. spatially close particles
+are scattered through memory. For both orders this compares
+  - fixed radius neighbour queries (local density)
+  - box selections: contiguous index runs (separate partial uploads), 4 KiB pages of the vertex
+    layout touched and the time to gather and upload the selected vertices
+"""
+import numpy as np
+import argparse
+from time import perf_counter
+from napari_particles.billboards_filter import BillboardsFilter, vertex_layout
+from napari_particles.spatial import morton_order, neighbour_counts
+
+
+def timeit(func, repeats):
+    func()
+    t = perf_counter()
+    for _ in range(repeats):
+        func()
+    return (perf_counter() - t) / repeats
+
+
+def filaments(n, n_filaments=200, extent=10000, rng=None):
+    """localizations along random (curved) filaments, in random (acquisition) order"""
+    rng = np.random.default_rng(0) if rng is None else rng
+    t = rng.uniform(0, 1, n)
+    k = rng.integers(0, n_filaments, n)
+    start = rng.uniform(0, extent, (n_filaments, 3)) * (0.1, 1, 1)
+    direction = rng.normal(0, 1, (n_filaments, 3)) * (0.05, 1, 1)
+    bend = rng.normal(0, 0.3, (n_filaments, 3)) * (0.05, 1, 1)
+    length = 0.2 * extent
+    coords = start[k] + length * (t[:, None] * direction[k] + t[:, None] ** 2 * bend[k])
+    return coords + rng.normal(0, 10, (n, 3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=10**6, help="number of particles")
+    parser.add_argument("--radius", type=float, default=30, help="radius of the neighbour queries")
+    parser.add_argument("--box", type=float, default=0.2, help="box size of the selections (fraction of the extent)")
+    parser.add_argument("--boxes", type=int, default=20, help="number of random box selections")
+    parser.add_argument("-r", "--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    coords = filaments(args.n, rng=rng)
+    lo, hi = coords.min(axis=0), coords.max(axis=0)
+    boxes = []
+    for _ in range(args.boxes):
+        corner = rng.uniform(lo, hi - args.box * (hi - lo))
+        boxes.append((corner, corner + args.box * (hi - lo)))
+
+    t = perf_counter()
+    order = morton_order(coords)
+    print(f"morton order                {1000 * (perf_counter() - t):8.1f} ms  ({args.n} particles)\n")
+
+    f = BillboardsFilter()
+    # upload without a visual
+    f._attached, f._visual = True, True
+    page = 4096 // (4 * vertex_layout(0).itemsize) or 1
+
+    for name, x in (("file order", coords), ("morton order", coords[order])):
+        layout = vertex_layout(4 * len(x))
+        selections = [np.where(np.all((x >= a) & (x <= b), axis=1))[0] for a, b in boxes]
+        faces = [(4 * i[:, None] + np.array([0, 1, 2, 0, 2, 3])).ravel() for i in selections]
+
+        t_density = timeit(lambda: neighbour_counts(x, args.radius), args.repeats)
+        runs = np.mean([1 + np.count_nonzero(np.diff(i) > 1) if len(i) > 0 else 0 for i in selections])
+        pages = np.mean([len(np.unique(i // page)) for i in selections])
+        selected = np.mean([len(i) for i in selections])
+
+        def gather():
+            for fc in faces:
+                f.set_vertex_data(layout, fc)
+
+        t_gather = timeit(gather, args.repeats) / len(faces)
+
+        print(f"{name}")
+        print(f"  neighbour queries        {1000 * t_density:8.1f} ms")
+        print(f"  box selection            {selected:8.0f} particles in {runs:.0f} contiguous runs, {pages:.0f} pages")
+        print(f"  gather + upload          {1000 * t_gather:8.2f} ms per box")
@@ -0,0 +1,63 @@
+"""
+Host side cost of preparing the per vertex billboard attributes for upload
+
+compares separate VertexBuffers per attribute (gathered, reversed and converted on every
+upload) with the single interleaved buffer used by BillboardsFilter
+"""
+import numpy as np
+import argparse
+from time import perf_counter
+from vispy.gloo import VertexBuffer
+from napari_particles.billboards_filter import BillboardsFilter, vertex_field, vertex_layout
+
+
+def timeit(func, repeats):
+    func()
+    t = perf_counter()
+    for _ in range(repeats):
+        func()
+    return (perf_counter() - t) / repeats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=10**6, help="number of particles")
+    parser.add_argument("-r", "--repeats", type=int, default=5)
+
+    args = parser.parse_args()
+
+    # 4 vertices per particle, 6 drawn vertices (2 faces) per particle
+    n = args.n
+    centercoords = np.repeat(np.random.uniform(0, 100, (n, 3)), 4, axis=0).astype(np.float32)
+    quatvec = np.zeros((4 * n, 3), np.float32)
+    texcoords = np.random.uniform(-1, 1, (4 * n, 2)).astype(np.float32)
+    sigmas = np.ones((n, 3), np.float32)
+    scale = np.ones(n, np.float32)
+    faces = (4 * np.arange(n)[:, None] + np.array([0, 1, 2, 0, 2, 3])).ravel()
+    particles = faces // 4
+
+    buffers = tuple(VertexBuffer(np.zeros((0, k), np.float32)) for k in (3, 3, 2, 3, 1))
+
+    def separate():
+        for buf, x in zip(buffers, (centercoords, quatvec, texcoords)):
+            buf.set_data(x[faces][:, ::-1], convert=True)
+        buffers[3].set_data(sigmas[particles][:, ::-1], convert=True)
+        buffers[4].set_data(scale[particles][:, np.newaxis], convert=True)
+
+    f = BillboardsFilter()
+    # upload without a visual
+    f._attached, f._visual = True, True
+
+    # the per mesh vertex layout is built once, every view update is a single gather
+    layout = vertex_layout(4 * n)
+    vertex_field(layout, "centercoords")[:] = centercoords
+    vertex_field(layout, "quatvec")[:] = quatvec
+    vertex_field(layout, "texcoords")[:] = texcoords
+    vertex_field(layout, "sigmas")[:] = np.repeat(sigmas, 4, axis=0)
+    vertex_field(layout, "scale")[:] = np.repeat(scale, 4)
+
+    def interleaved():
+        f.set_vertex_data(layout, faces)
+
+    for name, func in (("separate", separate), ("interleaved", interleaved)):
+        print(f"{name:12s} {1000 * timeit(func, args.repeats):8.1f} ms  ({args.n} particles)")
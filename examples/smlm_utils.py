@@ -2,6 +2,8 @@ import numpy as np
 from typing import Literal
 from smlm_file import readSmlmFile
 import pandas as pd
+from napari_particles.smlm import merge_localizations, load_localizations
+from napari_particles.stats import approx_percentile
 
 def coords_random(n=10**4, size = None, mode:Literal[None, 'no_z', 'small_z', 'only_2d']=None):
     coords = np.random.uniform(-100,100,(n,3))
@@ -36,13 +38,22 @@ def coords_from_smlm(fname):
     coords -= coords.mean(axis=0)
     size = 4*prop.get('uncertainty_xy',10)
     intens = prop.get('intensity_photon_',100)-prop.get('offset_photon_',0)
-    intens = intens/np.percentile(intens[::8],90)
+    intens = intens/approx_percentile(intens,90)
     return (coords, size, intens), prop
 
 
-def coords_from_csv(fname, delimiter=None):
+def coords_from_csv(fname, delimiter=None, merge_radius=None, merge_gap=1):
     df = pd.read_csv(fname, delimiter=delimiter)
+    return coords_from_table(df, merge_radius=merge_radius, merge_gap=merge_gap)
 
+
+def coords_from_csv_files(fnames, delimiter=None, merge_radius=None, merge_gap=1, workers=None):
+    """ loads several files concurrently into a single set of particles (the 'file' column tags their source) """
+    df = pd.DataFrame(load_localizations(fnames, delimiter=delimiter, workers=workers))
+    return coords_from_table(df, merge_radius=merge_radius, merge_gap=merge_gap)
+
+
+def coords_from_table(df, merge_radius=None, merge_gap=1):
     # standardize column names
     df = df.rename(columns={
         'x [nm]': 'xnm',
@@ -77,8 +88,20 @@ def coords_from_csv(fname, delimiter=None):
         intens = df['phot'].to_numpy()
     except KeyError:
         intens = 1/size
+
+    if merge_radius is not None and 'frame' in df.columns:
+        # collapse repeated blinks of the same emitter (df keeps the original rows)
+        n, ndim = coords.shape
+        sigmas = np.broadcast_to(sigmas, (n, 3))
+        coords, sigmas_merged, intens, labels = merge_localizations(coords, df['frame'].to_numpy(), 
+                                                    sigmas=sigmas[:,-ndim:], values=np.broadcast_to(intens, n),
+                                                    radius=merge_radius, max_gap=merge_gap)
+        sigmas = np.concatenate([sigmas_merged[:,:1]]*(3-ndim)+[sigmas_merged], axis=-1)
+        if not np.isscalar(size):
+            size = 4*sigmas[:,0]
+        print(f'merged {n} localizations into {len(coords)} particles')
     
-    intens = intens/np.percentile(intens[::8],95)
+    intens = intens/approx_percentile(intens,95)
 
 
     return (coords, size, intens), sigmas, df
@@ -7,13 +7,13 @@ WHERE random_index<10000000 AND parallax_over_error > 5
 """
 
 import numpy as np
-from pandas.core.tools.numeric import to_numeric
 np.random.seed(42)
 import argparse
 import napari
 from napari_particles.particles import Particles
 from napari_particles.filters import ShaderFilter
-import pandas as pd
+from napari_particles.catalog import load_catalog, magnitude_to_brightness
+from napari_particles.stats import approx_percentile
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -27,51 +27,14 @@ if __name__ == "__main__":
     np.random.seed(32)
 
 
-    if not 'df' in locals():
-        df = pd.read_csv(args.input)
-        df = df[df['parallax']>0]
-        df['mag_abs'] = df['phot_g_mean_mag'] - 5*(np.log10(1000/df['parallax'])-1)
-        
+    coords, mag_abs = load_catalog(args.input, step=args.sub)
 
-
-    df = df.iloc[::args.sub]
-
-
-    phi   = df['ra'].to_numpy()/180*np.pi
-    theta = df['dec'].to_numpy()/180*np.pi
-    r     = 1/df['parallax'].to_numpy()
-
-    
-    bright = df['mag_abs'].to_numpy()
-    mi, ma = np.percentile(bright[::10],0), np.percentile(bright[::10],99)
+    mi, ma = approx_percentile(mag_abs, (0, 99))
     # mi, ma = 6, 13
     # mi, ma = -3, 8
-    bright = 1-np.clip((bright-mi)/(ma-mi),0,1)
+    bright = magnitude_to_brightness(mag_abs, (mi, ma))
     size=args.size
     values = bright
-    
-    
-    
-    from astropy import units
-    from astropy.coordinates import SkyCoord, Galactocentric, Distance
-    c = SkyCoord(ra=units.Quantity(df['ra'])*units.degree, 
-                        dec=units.Quantity(df['dec'])*units.degree, 
-                        distance=Distance(parallax=df['parallax'].values*units.mas))
-    c_centered = c.transform_to(Galactocentric())
-    coords = np.stack([c_centered.z.value, c_centered.y.value, c_centered.x.value], axis=-1)
-
-
-    coords = np.stack([r*np.cos(phi)*np.cos(theta), 
-                       r*np.sin(phi)*np.cos(theta),
-                       r*np.sin(theta),
-                       ], axis=-1)
-    # orthogonal trafo into galactic coordinates
-    # https://gea.esac.esa.int/archive/documentation/GDR2/Data_processing/chap_cu3ast/sec_cu3ast_intro/ssec_cu3ast_intro_tansforms.html
-    A_galactic  = np.array([[-0.0548755604162154, 0.4941094278755837, -0.8676661490190047],
-                [-0.8734370902348850, -0.4448296299600112, -0.1980763734312015], 
-                [-0.4838350155487132, 0.7469822444972189, 0.4559837761750669]]).T                       
-    coords = np.einsum('ij,kj', A_galactic, coords).T
-    coords = coords[:,::-1]
 
     coords = coords - np.median(coords,axis=0)
 
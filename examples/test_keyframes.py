@@ -0,0 +1,51 @@
+import numpy as np
+
+np.random.seed(42)
+import argparse
+import napari
+from qtpy.QtCore import QTimer
+from napari_particles.particles import Particles
+from napari_particles.filters import ShaderFilter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=10**5)
+    parser.add_argument("-t", "--keyframes", type=int, default=100)
+    parser.add_argument("--speed", type=float, default=2, help="keyframes per second")
+    parser.add_argument("--size", type=float, default=0.5)
+    parser.add_argument("-s", "--shader", type=str, default="gaussian")
+    parser.add_argument("--fps", type=float, default=60)
+
+    args = parser.parse_args()
+
+    # random walks as a stand-in for simulation or tracking output
+    steps = np.random.normal(0, 0.5, (args.keyframes, args.n, 3)).astype(np.float32)
+    steps[0] = np.random.uniform(-20, 20, (args.n, 3))
+    trajectories = np.cumsum(steps, axis=0)
+
+    layer = Particles(
+        trajectories[0],
+        size=args.size,
+        values=np.random.uniform(0.2, 1, args.n),
+        colormap="Spectral",
+        filter=ShaderFilter(args.shader) if args.shader != "" else None,
+    )
+    layer.contrast_limits = (0, 1)
+
+    v = napari.Viewer()
+    layer.add_to_viewer(v)
+    layer.set_keyframes(trajectories)
+
+    v.dims.ndisplay = 3
+
+    def update():
+        # only the interpolation parameter changes between keyframes
+        t = layer.keyframe_time + args.speed / args.fps
+        layer.keyframe_time = t if t < layer.n_keyframes - 1 else 0
+
+    timer = QTimer()
+    timer.timeout.connect(update)
+    timer.start(int(1000 / args.fps))
+
+    napari.run()
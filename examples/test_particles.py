@@ -21,6 +21,7 @@ if __name__ == "__main__":
     parser.add_argument("--vol", action="store_true")
     parser.add_argument("--points", action="store_true")
     parser.add_argument("--sigmas", action="store_true")
+    parser.add_argument("--clusters", type=int, default=0, help="color by random cluster ids (direct RGBA colors)")
 
     args = parser.parse_args()
 
@@ -52,6 +53,13 @@ if __name__ == "__main__":
 
     rotvec = np.random.normal(0, 1, (len(coords), 3))
 
+    if args.clusters > 0:
+        palette = np.random.randint(64, 256, (args.clusters, 4)).astype(np.uint8)
+        palette[:, 3] = 255
+        colors = palette[np.random.randint(0, args.clusters, len(coords))]
+    else:
+        colors = None
+
     if args.points:
         layer = v.add_points(coords, size=size)
         v.layers[-1].blending = "additive"
@@ -62,6 +70,7 @@ if __name__ == "__main__":
             coords,
             size=size,
             values=args.values,
+            colors=colors,
             rotvec=rotvec,
             colormap=args.cmap,
             antialias=args.antialias,
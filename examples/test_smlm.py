@@ -1,9 +1,9 @@
 import numpy as np
 np.random.seed(42)
 import napari
-from smlm_utils import human_format, coords_from_smlm, coords_random, coords_from_csv
+from smlm_utils import human_format, coords_from_smlm, coords_random, coords_from_csv, coords_from_csv_files
 import argparse 
-from napari_particles.particles import Particles
+from napari_particles.particles import Particles, MultiChannelParticles
 from napari_particles.filters import ShaderFilter, TextureFilter
 
 
@@ -14,12 +14,19 @@ if __name__ == "__main__":
     parser.add_argument('-d', '--data', type=str, default='spectrin', 
         choices=['simple','simple2', 'actin2d', 'actin3d', 'spectrin','dual','mt', 'ries', 'ries2'])
     parser.add_argument('--plain', action='store_true')
+    parser.add_argument('--concurrent', action='store_true', help='load all input files concurrently into a single layer')
     parser.add_argument('--persp', action='store_true')
+    parser.add_argument('--merge', action='store_true', help='render all channels in a single layer')
     parser.add_argument('-a', '--antialias', type=float, default=0.005)
+    parser.add_argument('--blink-radius', type=float, default=None, help='merge repeated localizations within this radius (nm)')
+    parser.add_argument('--blink-gap', type=int, default=1, help='max number of dark frames between merged localizations')
+    parser.add_argument('--max-mb', type=float, default=None, help='memory budget per channel (subsamples larger datasets)')
+    parser.add_argument('--density', type=float, default=None, help='color the localizations by the number of neighbours within this radius (nm)')
 
     args = parser.parse_args() 
 
     sigma = None 
+    merge_kwargs = dict(merge_radius=args.blink_radius, merge_gap=args.blink_gap)
 
 
     if args.input is None:
@@ -28,7 +35,7 @@ if __name__ == "__main__":
         elif args.data=='simple2':
             data = [coords_random(10**5, size=None, mode='small_z')]
         elif args.data=='spectrin':
-            data = [coords_from_csv('data/smlm/spectrin.csv')[:2]]
+            data = [coords_from_csv('data/smlm/spectrin.csv', **merge_kwargs)[:2]]
             data, sigma = tuple(zip(*data))
         elif args.data=='mt':
             data = [coords_from_smlm('data/smlm/leterrier_mt_simple.smlm')[0]]
@@ -37,24 +44,26 @@ if __name__ == "__main__":
         elif args.data=='actin3d':
             data = [coords_from_smlm('data/smlm/leterrier_actin3d.smlm')[0]]
         elif args.data=='dual':
-            data = [coords_from_csv('data/smlm/cos_clathrin.csv', delimiter='\t')[:2],
-                    coords_from_csv('data/smlm/cos_mt.csv', delimiter='\t')[:2]]
+            data = [coords_from_csv('data/smlm/cos_clathrin.csv', delimiter='\t', **merge_kwargs)[:2],
+                    coords_from_csv('data/smlm/cos_mt.csv', delimiter='\t', **merge_kwargs)[:2]]
             data, sigma = tuple(zip(*data))
 
         elif args.data=='ries':
-            data = [coords_from_csv('data/smlm/ries_nup.csv', delimiter=',')[:2]]
+            data = [coords_from_csv('data/smlm/ries_nup.csv', delimiter=',', **merge_kwargs)[:2]]
             data, sigma = tuple(zip(*data))
         elif args.data=='ries2':
-            data = [coords_from_csv('/Users/weigert/Downloads/MT_grouped.csv', delimiter=',')[:2]]
+            data = [coords_from_csv('/Users/weigert/Downloads/MT_grouped.csv', delimiter=',', **merge_kwargs)[:2]]
             data, sigma = tuple(zip(*data))
 
                     
+    elif args.concurrent:
+        data = [coords_from_csv_files(args.input, delimiter=',', **merge_kwargs)[0]]
     else:
         data = []
         for f in args.input:
             for delim in ('\t', ',', ' '):
                 try:
-                    d = coords_from_csv(f,delimiter=delim)[0]
+                    d = coords_from_csv(f,delimiter=delim, **merge_kwargs)[0]
                     data.append(d)
                     break
                 except Exception as e:
@@ -70,6 +79,25 @@ if __name__ == "__main__":
     v = napari.Viewer()
 
 
+    if args.merge and len(data)>1:
+        coords   = np.concatenate([d[0] for d in data])
+        size     = np.concatenate([np.broadcast_to(d[1], len(d[0])) for d in data])
+        values   = np.concatenate([np.broadcast_to(d[2], len(d[0])) for d in data])
+        channels = np.concatenate([np.full(len(d[0]), i) for i, d in enumerate(data)])
+        sigma    = np.concatenate([np.broadcast_to(s/np.max(s, axis=-1, keepdims=True), (len(d[0]), 3)) 
+                                   for d, s in zip(data, sigma)])
+        print(f'rendering {human_format(len(coords))} particles in {len(data)} channels... ')
+        layer = MultiChannelParticles(coords, channels=channels, values=values, 
+            size=size, 
+            colormaps=cmaps,
+            channel_contrast_limits=[(0,1)]*len(data),
+            sigmas = sigma,
+            antialias=args.antialias, 
+            filter = ShaderFilter('gaussian'), 
+            )
+        layer.add_to_viewer(v)
+        data = []
+
     for (coords, size, values), sigma, cmap in zip(data, sigma, cmaps):
         print(f'rendering {human_format(len(coords))} particles... ')
         #size = .5*size
@@ -86,9 +114,12 @@ if __name__ == "__main__":
             sigmas = sigma,
             antialias=args.antialias, 
             filter = ShaderFilter('gaussian'), 
+            max_bytes = None if args.max_mb is None else int(args.max_mb * 2**20),
             )
 
         layer.contrast_limits=(0,1)
+        if args.density is not None:
+            layer.set_local_density(args.density, workers=None)
         print('adding')
         layer.add_to_viewer(v)
         
@@ -5,6 +5,7 @@ import argparse
 import napari
 from napari_particles.particles import Particles
 from napari_particles.filters import ShaderFilter
+from napari_particles.decimate import preview_layer
 import pandas as pd
 
 
@@ -25,6 +26,8 @@ if __name__ == "__main__":
     parser.add_argument('-s','--shader',  type=str, default='particle')
     parser.add_argument('-a','--antialias',  type=float, default=0.05)
     parser.add_argument('--points', action='store_true')
+    parser.add_argument('--preview', type=int, default=None, help='decimate to at most this many particles')
+    parser.add_argument('--preview-method', type=str, default='voxel', choices=('voxel', 'poisson'))
     args = parser.parse_args() 
 
     np.random.seed(32)
@@ -73,16 +76,20 @@ if __name__ == "__main__":
         v.add_points(coords, size=size)
         v.layers[-1].blending='additive'
     else:
-        layer = Particles(coords, 
+        kwargs = dict(
             size=size, 
             values=values,
             colormap='Spectral',
             filter = ShaderFilter(args.shader, distance_intensity_increase=args.antialias) if args.shader !="" else None, 
             antialias=args.antialias,
         )
-
-
-        layer.contrast_limits=(0,1)
+        if args.preview is not None:
+            layer = preview_layer(coords, max_particles=args.preview, method=args.preview_method, **kwargs)
+            # merged values are summed
+            layer.contrast_limits=(0, layer.statistics('values').percentile(99))
+        else:
+            layer = Particles(coords, **kwargs)
+            layer.contrast_limits=(0,1)
 
         layer.add_to_viewer(v)
 
@@ -0,0 +1,54 @@
+import numpy as np
+
+np.random.seed(42)
+import argparse
+import napari
+from qtpy.QtCore import QTimer
+from napari_particles.particles import Particles
+from napari_particles.filters import ShaderFilter
+from napari_particles.system import ParticleSystem
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=10**5)
+    parser.add_argument("--rate", type=int, default=None, help="emitted particles per frame")
+    parser.add_argument("--size", type=float, default=0.5)
+    parser.add_argument("--lifetime", type=float, default=3)
+    parser.add_argument("-s", "--shader", type=str, default="gaussian")
+    parser.add_argument("--fps", type=float, default=30)
+
+    args = parser.parse_args()
+
+    rate = args.rate if args.rate is not None else int(args.n / args.lifetime / args.fps)
+
+    # a fountain: particles are emitted upwards (along z) and pulled back by gravity
+    system = ParticleSystem(args.n, lifetime=args.lifetime, gravity=(-20, 0, 0), damping=0.1)
+
+    layer = Particles.from_system(
+        system,
+        size=args.size,
+        values=np.random.uniform(0.2, 1, args.n),
+        colormap="Spectral",
+        filter=ShaderFilter(args.shader) if args.shader != "" else None,
+    )
+    layer.contrast_limits = (0, 1)
+
+    v = napari.Viewer()
+    layer.add_to_viewer(v)
+
+    v.dims.ndisplay = 3
+    v.camera.perspective = 50
+    v.camera.zoom = 5
+
+    def update():
+        vel = np.random.normal(0, 2, (rate, 3))
+        vel[:, 0] = np.random.uniform(20, 30, rate)
+        system.emit(np.zeros((rate, 3)), velocities=vel)
+        layer.step(1 / args.fps)
+
+    timer = QTimer()
+    timer.timeout.connect(update)
+    timer.start(int(1000 / args.fps))
+
+    napari.run()
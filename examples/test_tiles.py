@@ -0,0 +1,43 @@
+import numpy as np
+
+np.random.seed(42)
+import argparse
+import os
+import napari
+from napari_particles.filters import ShaderFilter
+from napari_particles.tiles import TiledParticles, write_tiled
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", type=str, default="data/random.tiles")
+    parser.add_argument("-n", type=int, default=10**6, help="number of particles if the dataset has to be created")
+    parser.add_argument("--tile-size", type=float, default=100)
+    parser.add_argument("--max-particles", type=int, default=10**6)
+    parser.add_argument("-s", "--shader", type=str, default="gaussian")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"writing random dataset to {args.input}")
+        coords = np.random.uniform(0, 1000, (args.n, 3))
+        coords[:, 0] *= 0.1
+        write_tiled(
+            args.input,
+            coords,
+            tile_size=args.tile_size,
+            size=np.random.uniform(1, 3, args.n),
+            values=np.random.uniform(0.2, 1, args.n),
+        )
+
+    layer = TiledParticles(
+        args.input,
+        max_particles=args.max_particles,
+        colormap="Spectral",
+        filter=ShaderFilter(args.shader) if args.shader != "" else None,
+    )
+
+    v = napari.Viewer()
+    layer.add_to_viewer(v)
+
+    napari.run()
@@ -1,9 +1,28 @@
 
 __version__ = "0.0.1"
 
-#from particles_layer import Particles
+# the layer classes (and with them napari/vispy/scipy) are only imported on first access,
+# such that plugin discovery does not add to napari's startup time
+_LAZY_ATTRIBUTES = dict(
+    Particles="particles",
+    MultiChannelParticles="particles",
+    ShaderFilter="filters",
+    BillboardsFilter="billboards_filter",
+    ParticleSystem="system",
+    preview_layer="decimate",
+)
 
+__all__ = ["__version__"] + list(_LAZY_ATTRIBUTES)
 
 
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
 
+        module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
+
+def __dir__():
+    return __all__
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture
+def viewer():
+    napari = pytest.importorskip("napari")
+    v = napari.Viewer(show=False)
+    yield v
+    v.close()
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from napari_particles.catalog import absolute_magnitude, load_catalog, radec_to_galactic
+
+pd = pytest.importorskip("pandas")
+
+
+@pytest.mark.parametrize("chunksize", [7, 1000])
+def test_load_catalog_subsamples_before_the_parallax_filter(tmp_path, chunksize):
+    rng = np.random.default_rng(0)
+    n = 100
+    df = pd.DataFrame(
+        dict(
+            ra=rng.uniform(0, 360, n),
+            dec=rng.uniform(-90, 90, n),
+            parallax=rng.uniform(-1, 5, n),
+            phot_g_mean_mag=rng.uniform(5, 20, n),
+        )
+    )
+    fname = str(tmp_path / "catalog.csv")
+    df.to_csv(fname, index=False)
+
+    coords, mag_abs = load_catalog(fname, chunksize=chunksize, step=3, min_parallax=0.5)
+
+    rows = df.iloc[::3]
+    rows = rows[rows.parallax > 0.5]
+    assert np.allclose(coords, radec_to_galactic(rows.ra, rows.dec, rows.parallax), atol=1e-5)
+    assert np.allclose(mag_abs, absolute_magnitude(rows.phot_g_mean_mag, rows.parallax).to_numpy(), atol=1e-5)
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from napari_particles.decimate import poisson_disk_downsample, voxel_downsample
+
+
+@pytest.mark.parametrize("downsample", [voxel_downsample, poisson_disk_downsample])
+def test_downsample_keeps_total_brightness(downsample):
+    rng = np.random.default_rng(0)
+    coords = rng.uniform(0, 100, (2000, 3))
+    values = rng.uniform(0, 1, len(coords))
+    new_coords, new_values, size, labels = downsample(coords, 10, values=values)
+    assert len(new_coords) == len(new_values) == len(size) < len(coords)
+    assert labels.shape == (len(coords),) and labels.max() == len(new_coords) - 1
+    assert np.isclose(new_values.sum(), values.sum())
+
+
+@pytest.mark.parametrize("downsample", [voxel_downsample, poisson_disk_downsample])
+def test_downsample_empty(downsample):
+    coords, values, size, labels = downsample(np.zeros((0, 3)), 10)
+    assert coords.shape == (0, 3)
+    assert values.shape == size.shape == labels.shape == (0,)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from napari_particles.billboards_filter import vertex_field
+from napari_particles.particles import Particles
+
+
+@pytest.fixture
+def keyframe_layer(viewer):
+    rng = np.random.default_rng(0)
+    keyframes = np.cumsum(rng.normal(0, 1, (4, 200, 3)), axis=0)
+    layer = Particles(keyframes[0], size=1)
+    layer.add_to_viewer(viewer)
+    viewer.dims.ndisplay = 3
+
+    # the keyframe buffers are write-only, record what is uploaded into the two slots
+    f = layer._billboard_filter
+    slots = {}
+    set_keyframe = f.set_keyframe
+
+    def _record(data, current=False):
+        slot = f._keyframe_current if current else 1 - f._keyframe_current
+        slots[slot] = data.copy()
+        set_keyframe(data, current=current)
+
+    f.set_keyframe = _record
+
+    def blended():
+        """the centers the shader computes, mix(current, next, keyframe_t)"""
+        current, following = slots[f._keyframe_current], slots[1 - f._keyframe_current]
+        t = f.keyframe_t
+        return (1 - t) * vertex_field(current, "centercoords") + t * vertex_field(following, "centercoords")
+
+    layer.set_keyframes(keyframes)
+    yield layer, keyframes, blended
+    layer.set_keyframes(None)
+
+
+def test_keyframe_blend(keyframe_layer):
+    layer, keyframes, blended = keyframe_layer
+    rows = layer._view_faces.flatten() // 4
+
+    for time in (0, 1.5, 2.25, 3):
+        layer.keyframe_time = time
+        k = min(int(time), len(keyframes) - 2)
+        t = time - k
+        assert np.isclose(layer._billboard_filter.keyframe_t, t)
+        expected = (1 - t) * keyframes[k][rows] + t * keyframes[k + 1][rows]
+        assert np.allclose(blended(), expected, atol=1e-5)
+
+    # t=1.5 is the half-way mix of the keyframes 1 and 2
+    layer.keyframe_time = 1.5
+    assert np.allclose(blended(), 0.5 * (keyframes[1][rows] + keyframes[2][rows]), atol=1e-5)
+
+
+def test_keyframe_executor_is_shut_down(keyframe_layer, viewer):
+    layer, keyframes, _ = keyframe_layer
+    layer.keyframe_time = 0.5
+    executor = layer._keyframe_executor
+    assert executor is not None
+    layer.set_keyframes(None)
+    assert layer._keyframe_executor is None and executor._shutdown
+
+    layer.set_keyframes(keyframes)
+    executor = layer._keyframe_executor
+    viewer.layers.remove(layer)
+    assert layer._keyframe_executor is None and executor._shutdown
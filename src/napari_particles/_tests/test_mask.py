@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from napari_particles.particles import Particles
+
+
+def _drawn(layer):
+    """the (input) index of every drawn particle, every particle owns 2 faces"""
+    particles = layer._view_faces[::2, 0] // 4
+    return np.sort(particles if layer.order is None else layer.order[particles])
+
+
+def _show_3d(layer):
+    # all particles are in view (without a viewer, 2D layers only show the slice at z=0)
+    layer._slice_dims(ndisplay=3)
+    return layer
+
+
+@pytest.mark.parametrize("reorder", [None, "morton"])
+def test_set_mask(reorder):
+    rng = np.random.default_rng(0)
+    layer = _show_3d(Particles(rng.uniform(0, 100, (500, 3)), reorder=reorder))
+    faces = layer._view_faces
+    assert len(faces) == 2 * 500
+
+    mask = rng.uniform(0, 1, 500) < 0.3
+    layer.mask = mask
+    assert len(layer._view_faces) == 2 * np.count_nonzero(mask)
+    assert np.array_equal(_drawn(layer), np.flatnonzero(mask))
+    assert np.array_equal(layer.mask, mask)
+
+    # clearing the mask restores the full view
+    layer.set_mask(None)
+    assert layer.mask is None
+    assert np.array_equal(layer._view_faces, faces)
+
+
+@pytest.mark.parametrize("reorder", [None, "morton"])
+def test_filter_by(reorder):
+    rng = np.random.default_rng(0)
+    photons = rng.uniform(0, 2000, 500)
+    layer = Particles(rng.uniform(0, 100, (500, 3)), values=photons, properties=dict(phot=photons), reorder=reorder)
+    _show_3d(layer)
+    layer.filter_by(lambda attrs: attrs["phot"] > 1000)
+    assert np.array_equal(_drawn(layer), np.flatnonzero(photons > 1000))
+    # the attributes are given in the input order
+    layer.filter_by(lambda attrs: attrs["values"] < 500)
+    assert np.array_equal(_drawn(layer), np.flatnonzero(photons < 500))
+
+
+def test_mask_in_slab_view(viewer):
+    rng = np.random.default_rng(0)
+    coords = rng.uniform(0, 100, (1000, 3))
+    layer = Particles(coords, slab_thickness=10, reorder="morton")
+    layer.add_to_viewer(viewer)
+    viewer.dims.set_point(0, 50)
+    mask = coords[:, 1] < 50
+    layer.mask = mask
+    assert np.array_equal(_drawn(layer), np.flatnonzero(mask & (np.abs(coords[:, 0] - 50) <= 5)))
+    layer.mask = None
+    assert np.array_equal(_drawn(layer), np.flatnonzero(np.abs(coords[:, 0] - 50) <= 5))
+
+
+def test_mask_shape_is_checked():
+    layer = Particles(np.zeros((10, 3)))
+    with pytest.raises(ValueError):
+        layer.mask = np.ones(5, dtype=bool)
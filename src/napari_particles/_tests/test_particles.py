@@ -0,0 +1,287 @@
+import numpy as np
+import pytest
+from napari_particles.particles import MultiChannelParticles, Particles
+
+
+def drawn_values(layer):
+    """the per particle values vispy draws (rebuilt from the mesh data, like after any clim/cmap change)"""
+    layer._visual._update_data()
+    values = layer._visual.mesh_data.get_vertex_values(indexed="faces")
+    # the 6 drawn vertices of a particle share its value
+    return values.reshape((-1, 6))[:, 0]
+
+
+def test_values_survive_contrast_limits_change(viewer):
+    rng = np.random.default_rng(0)
+    layer = Particles(rng.uniform(0, 100, (100, 3)), values=1)
+    layer.add_to_viewer(viewer)
+    viewer.dims.ndisplay = 3
+    # a drawn frame (such that values are set via the fast path)
+    layer._visual._update_data()
+
+    values = rng.uniform(0, 1, 100)
+    layer.values = values
+    layer.contrast_limits = (0, 0.5)
+    layer.colormap = "magma"
+    assert np.allclose(np.sort(drawn_values(layer)), np.sort(values))
+
+
+def test_local_density_is_drawn(viewer):
+    rng = np.random.default_rng(0)
+    coords = np.concatenate([rng.normal(0, 1, (200, 3)), rng.uniform(-50, 50, (200, 3))])
+    layer = Particles(coords, values=0)
+    layer.add_to_viewer(viewer)
+    viewer.dims.ndisplay = 3
+    layer._visual._update_data()
+
+    density = layer.set_local_density(2)
+    assert density.max() > 0
+    assert np.allclose(layer.values, density)
+    assert np.allclose(np.sort(drawn_values(layer)), np.sort(density))
+
+
+def test_local_density_multichannel(viewer):
+    rng = np.random.default_rng(0)
+    coords = np.concatenate([rng.normal(0, 1, (200, 3)), rng.uniform(-50, 50, (200, 3))])
+    channels = np.repeat([0, 1], 200)
+    layer = MultiChannelParticles(coords, channels, values=0)
+    layer.add_to_viewer(viewer)
+    viewer.dims.ndisplay = 3
+    layer._visual._update_data()
+
+    density = layer.set_local_density(10)
+    assert np.allclose(layer.values, density)
+    drawn = drawn_values(layer)
+    assert np.allclose(np.sort(drawn), np.sort(layer._stacked_values()))
+    # every channel is drawn within its own range of the stacked colormap
+    channels = layer._channels[layer._view_faces[::2, 0] // 4]
+    for c in range(2):
+        assert np.all((drawn[channels == c] >= c) & (drawn[channels == c] < c + 1))
+        assert np.isclose(drawn[channels == c].max(), c + 1 - layer._channel_gap)
+
+
+def test_channel_values_survive_colormap_change(viewer):
+    rng = np.random.default_rng(0)
+    channels = rng.integers(0, 3, 300)
+    layer = MultiChannelParticles(rng.uniform(0, 100, (300, 3)), channels, values=rng.uniform(0, 10, 300))
+    layer.add_to_viewer(viewer)
+    viewer.dims.ndisplay = 3
+    layer._visual._update_data()
+
+    layer.channel_contrast_limits = ((0, 5), (2, 8), (0, 20))
+    layer.channel_colormaps = ("red", "green", "blue")
+    assert np.allclose(np.sort(drawn_values(layer)), np.sort(layer._stacked_values()))
+
+
+def test_stacked_colormap_spans_every_channel():
+    rng = np.random.default_rng(0)
+    channels = np.arange(300) % 3
+    layer = MultiChannelParticles(
+        rng.uniform(0, 100, (300, 3)), channels, values=rng.uniform(0, 10, 300), colormaps=("red", "green", "blue")
+    )
+    values = layer._stacked_values() / layer.n_channels
+    for c, cmap in enumerate(layer.channel_colormaps):
+        v = values[channels == c]
+        # the bottom and top of every channel colormap are reached
+        assert np.allclose(layer.colormap.map(v.min()), cmap.map(0), atol=1e-2)
+        assert np.allclose(layer.colormap.map(v.max()), cmap.map(1), atol=1e-2)
+
+
+def test_slab_steps_reuse_the_view_vertices(viewer):
+    rng = np.random.default_rng(0)
+    layer = Particles(rng.uniform(0, 100, (1000, 3)), slab_thickness=10)
+    layer.add_to_viewer(viewer)
+    viewer.dims.set_point(0, 40)
+    data_view = layer._data_view
+    viewer.dims.set_point(0, 60)
+    assert layer._data_view is data_view
+    # only the particles within the slab are drawn
+    z = layer._coords[layer._view_faces[:, 0] // 4, 0]
+    assert np.all(np.abs(z - 60) <= 5)
+
+
+def test_statistics_per_column():
+    rng = np.random.default_rng(0)
+    sigmas = rng.uniform(0, 1, (500, 3)) * [1, 10, 100]
+    layer = Particles(rng.uniform(0, 100, (500, 3)), sigmas=sigmas, values=rng.uniform(0, 1, 500))
+    for c in range(3):
+        stats = layer.statistics("sigmas", column=c)
+        assert np.isclose(stats.min, sigmas[:, c].min(), rtol=1e-6)
+        assert np.isclose(stats.max, sigmas[:, c].max(), rtol=1e-6)
+    with pytest.raises(ValueError):
+        layer.statistics("sigmas")
+    assert np.isclose(layer.statistics("values").max, layer.values.max())
+
+
+def test_estimate_memory_usage():
+    usage = Particles.estimate_memory_usage(10**7)
+    assert usage == {"host": 11240000000, "gpu": 3840000000}
+    assert Particles.estimate_memory_usage(10**7, quantize=True)["host"] < usage["host"]
+
+
+def test_memory_usage_counts_buffers():
+    layer = Particles(np.random.default_rng(0).uniform(0, 100, (1000, 3)))
+    host = layer.memory_usage()["host"]
+    assert host["coords"] == layer._coords.nbytes
+    assert host["vertex_layout"] == layer._vertex_layout.nbytes
+    assert "colors" not in host
+    # the same order of magnitude as the estimate (without the GPU side views)
+    estimate = Particles.estimate_memory_usage(1000)["host"]
+    assert 0.25 * estimate < sum(host.values()) < 2 * estimate
+
+
+@pytest.mark.parametrize("budget", [dict(max_particles=1000), dict(max_bytes=1000 * 1524)])
+def test_budget_subsamples_and_keeps_brightness(budget):
+    rng = np.random.default_rng(0)
+    n = 5000
+    values = rng.uniform(0, 1, n)
+    properties = dict(frame=np.arange(n))
+    with pytest.warns(UserWarning, match="subsampling"):
+        layer = Particles(
+            rng.uniform(0, 100, (n, 3)), values=values, size=rng.uniform(1, 2, n), properties=properties, **budget
+        )
+    m = len(layer._coords)
+    usage = Particles.estimate_memory_usage(m)
+    assert m <= 1000 if "max_particles" in budget else usage["host"] + usage["gpu"] <= budget["max_bytes"]
+    assert m > 500
+    assert len(layer.size) == len(layer.values) == len(layer.attributes["frame"]) == m
+    # the total brightness is preserved
+    assert np.isclose(layer.values.sum(), values.sum())
+
+
+def test_no_subsampling_within_budget(recwarn):
+    layer = Particles(np.zeros((100, 3)), max_particles=100)
+    assert len(layer._coords) == 100
+    assert not any("subsampling" in str(w.message) for w in recwarn)
+
+
+def test_view_dims_compatibility():
+    from types import SimpleNamespace
+    from napari_particles.particles import _view_dims
+
+    layer = Particles(np.zeros((10, 3)))
+    assert _view_dims(layer) == ((1, 2), (0,))
+    # napari >= 0.4.18
+    new = SimpleNamespace(_slice_input=SimpleNamespace(displayed=[1, 2], not_displayed=[0]))
+    assert _view_dims(new) == ((1, 2), (0,))
+
+
+
+@pytest.fixture
+def deferred_worker(monkeypatch):
+    """`build_async` workers are not started, so that the test can connect to all signals and run them in this thread"""
+    pytest.importorskip("napari")
+    from napari.qt.threading import GeneratorWorker
+
+    monkeypatch.setattr(GeneratorWorker, "start", lambda self: None)
+
+
+def test_build_async_matches_serial(deferred_worker):
+    rng = np.random.default_rng(0)
+    coords, values = rng.uniform(0, 100, (1000, 3)), rng.uniform(0, 1, 1000)
+    worker = Particles.build_async(coords, values=values, size=2)
+    progress, returned = [], []
+    worker.yielded.connect(progress.append)
+    worker.returned.connect(returned.append)
+    worker.run()
+
+    assert len(progress) == Particles._BUILD_STEPS
+    assert [p[0] for p in progress] == sorted(p[0] for p in progress)
+    assert progress[-1] == (1.0, "initializing layer")
+    (layer,) = returned
+    serial = Particles(coords, values=values, size=2)
+    assert np.array_equal(layer._coords, serial._coords)
+    assert np.array_equal(layer._view_faces, serial._view_faces)
+
+
+def test_build_async_quit(deferred_worker):
+    worker = Particles.build_async(np.zeros((1000, 3)))
+    returned, aborted = [], []
+    worker.returned.connect(returned.append)
+    worker.aborted.connect(lambda: aborted.append(True))
+    worker.quit()
+    worker.run()
+    assert aborted and not returned
+
+
+def drawn_colors(layer):
+    """the uint8 RGBA colors uploaded for every drawn vertex"""
+    # the view update that happens before the next frame
+    layer._flush_billboard_update()
+    uploaded = []
+    f = layer._billboard_filter
+    set_colors = f.set_colors
+    f.set_colors = lambda colors: (uploaded.append(colors), set_colors(colors))
+    try:
+        layer._upload_colors()
+    finally:
+        del f.set_colors
+    (pairs,) = uploaded
+    pairs = pairs.astype(np.int64)
+    return np.stack([pairs[:, 0] // 256, pairs[:, 0] % 256, pairs[:, 1] // 256, pairs[:, 1] % 256], axis=-1)
+
+
+@pytest.mark.parametrize("reorder", [None, "morton"])
+def test_colors_follow_the_input_order(viewer, reorder):
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 256, (500, 4), dtype=np.uint8)
+    layer = Particles(rng.uniform(0, 100, (500, 3)), colors=colors, reorder=reorder)
+    layer.add_to_viewer(viewer)
+    viewer.dims.ndisplay = 3
+    assert np.array_equal(layer.colors, colors)
+
+    # every drawn vertex gets the color of its particle (in input order)
+    layer._flush_billboard_update()
+    assert len(layer._view_particles) == 6 * 500
+    particles = layer._view_particles if layer.order is None else layer.order[layer._view_particles]
+    assert np.array_equal(drawn_colors(layer), colors[particles])
+
+    mask = rng.uniform(0, 1, 500) < 0.3
+    layer.mask = mask
+    layer._flush_billboard_update()
+    particles = layer._view_particles if layer.order is None else layer.order[layer._view_particles]
+    assert len(particles) == 6 * np.count_nonzero(mask)
+    assert np.all(mask[particles])
+    assert np.array_equal(drawn_colors(layer), colors[particles])
+
+    layer.colors = "red"
+    assert np.array_equal(drawn_colors(layer), np.tile([255, 0, 0, 255], (len(particles), 1)))
+    layer.colors = None
+    assert layer.colors is None and not layer._billboard_filter.colors
+
+
+def test_reorder_keeps_the_input_order():
+    rng = np.random.default_rng(0)
+    coords = rng.uniform(0, 100, (500, 3))
+    values, size, photons = rng.uniform(0, 1, 500), rng.uniform(1, 2, 500), rng.uniform(0, 2000, 500)
+    layers = [
+        Particles(coords, values=values, size=size, properties=dict(phot=photons), reorder=reorder)
+        for reorder in (None, "morton")
+    ]
+    plain, layer = layers
+    assert layer.order is not None and not np.array_equal(layer.order, np.arange(500))
+
+    assert np.allclose(layer.values, values)
+    assert np.allclose(layer.size, size)
+    attrs = layer.attributes
+    assert np.allclose(attrs["coords"], coords)
+    assert np.allclose(attrs["phot"], photons)
+    for name in ("values", "size", "phot"):
+        assert np.array_equal(attrs[name], plain.attributes[name])
+
+    # setters take the input order
+    values, size = rng.uniform(0, 1, 500), rng.uniform(1, 2, 500)
+    mask = rng.uniform(0, 1, 500) < 0.5
+    for l in layers:
+        l.values, l.size, l.mask = values, size, mask
+    assert np.allclose(layer.values, values)
+    assert np.allclose(layer.size, size)
+    assert np.array_equal(layer.mask, mask)
+    assert np.array_equal(layer.mask, plain.mask)
+
+    # the statistics do not depend on the order
+    for name in ("values", "size", "phot"):
+        for attr in ("min", "max"):
+            assert getattr(layer.statistics(name), attr) == getattr(plain.statistics(name), attr)
+        assert np.allclose(layer.statistics(name).percentile((10, 50, 90)), plain.statistics(name).percentile((10, 50, 90)))
+    assert np.isclose(layer.statistics("values").max, values.max())
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from napari_particles.billboards_filter import VERTEX_DTYPE, vertex_field
+from napari_particles.particles import Particles
+from napari_particles.quantize import QuantizedLayout
+
+
+def _gather(layout, index):
+    out = np.empty(len(index), dtype=VERTEX_DTYPE)
+    if isinstance(layout, np.ndarray):
+        np.take(layout, index, out=out)
+    else:
+        layout.gather(index, out=out)
+    return out
+
+
+@pytest.mark.parametrize("max_error", [1e-3, 0.05, 1.0])
+def test_quantized_gather_matches_float32(max_error):
+    rng = np.random.default_rng(0)
+    n = 2000
+    kwargs = dict(
+        size=rng.uniform(1, 3, n),
+        sigmas=rng.uniform(0.5, 2, (n, 3)),
+        rotvec=rng.normal(0, 1, (n, 3)),
+        values=rng.uniform(0, 1, n),
+    )
+    coords = rng.uniform(-500, 500, (n, 3))
+    layer = Particles(coords, **kwargs)
+    compact = Particles(coords, quantize=max_error, **kwargs)
+    assert isinstance(compact._vertex_layout, QuantizedLayout)
+    assert 0 < compact.quantization_error <= max_error
+    assert layer.quantization_error == 0
+
+    index = rng.permutation(4 * n)
+    a, b = _gather(layer._vertex_layout, index), _gather(compact._vertex_layout, index)
+    err = np.linalg.norm(vertex_field(a, "centercoords") - vertex_field(b, "centercoords"), axis=-1)
+    # float32 rounding of the centers on top of the quantization
+    assert np.max(err) <= compact.quantization_error + 1e-4
+    assert np.allclose(vertex_field(a, "sigmas"), vertex_field(b, "sigmas"), rtol=1e-3)
+    assert np.allclose(vertex_field(a, "quatvec"), vertex_field(b, "quatvec"), atol=1e-4)
+    assert np.array_equal(vertex_field(a, "texcoords"), vertex_field(b, "texcoords"))
+    assert np.array_equal(vertex_field(a, "scale"), vertex_field(b, "scale"))
+
+
+def test_quantized_setters():
+    rng = np.random.default_rng(0)
+    layer = Particles(rng.uniform(0, 100, (100, 3)), quantize=0.01)
+    layer.sigmas = (2, 3, 4)
+    layer.size = 5
+    centers, sigmas, _ = layer._vertex_layout.dequantize()
+    assert np.allclose(sigmas, (2, 3, 4))
+    assert np.all(np.linalg.norm(centers - layer._coords, axis=-1) <= layer.quantization_error + 1e-9)
+    out = _gather(layer._vertex_layout, np.arange(400))
+    assert np.all(vertex_field(out, "scale") == 5)
+
+
+def test_quantized_layout_rejects_invalid_error():
+    with pytest.raises(ValueError):
+        QuantizedLayout(np.zeros((1, 3)), np.ones((1, 3)), np.zeros((1, 3)), np.ones(1), max_error=0)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from napari_particles import smlm
+from napari_particles.smlm import load_localizations, merge_localizations
+
+pd = pytest.importorskip("pandas")
+
+
+def _write_tables(path, n_files=3):
+    rng = np.random.default_rng(0)
+    files, tables = [], []
+    for i in range(n_files):
+        n = 100 * (i + 1)
+        df = pd.DataFrame(
+            {"x [nm]": rng.uniform(0, 1e4, n), "y [nm]": rng.uniform(0, 1e4, n), "frame": rng.integers(0, 1000, n)}
+        )
+        if i == 1:
+            # columns not present in every file are dropped
+            df["extra"] = 1.0
+        fname = str(path / f"locs_{i}.csv")
+        df.to_csv(fname, index=False)
+        files.append(fname)
+        tables.append(df)
+    return files, tables
+
+
+@pytest.mark.parametrize("shared", [True, False])
+def test_load_localizations_concurrent_equals_serial(tmp_path, monkeypatch, shared):
+    monkeypatch.setattr(smlm, "_SHARED_MEMORY", shared)
+    files, tables = _write_tables(tmp_path)
+
+    serial = load_localizations(files, workers=1)
+    concurrent = load_localizations(files, workers=3, channels=[0, 1, 1])
+
+    assert sorted(serial) == ["file", "frame", "x [nm]", "y [nm]"]
+    for c in ("x [nm]", "y [nm]", "frame"):
+        expected = np.concatenate([df[c].to_numpy(np.float32) for df in tables])
+        assert np.array_equal(serial[c], expected)
+        assert np.array_equal(concurrent[c], expected)
+    assert np.array_equal(serial["file"], np.repeat([0, 1, 2], [100, 200, 300]))
+    assert np.array_equal(concurrent["channel"], np.repeat([0, 1, 1], [100, 200, 300]))
+
+
+def test_load_localizations_glob_and_columns(tmp_path):
+    files, tables = _write_tables(tmp_path)
+    table = load_localizations(str(tmp_path / "locs_*.csv"), columns=["x [nm]"], workers=2)
+    assert sorted(table) == ["file", "x [nm]"]
+    assert np.array_equal(table["x [nm]"], np.concatenate([df["x [nm]"].to_numpy(np.float32) for df in tables]))
+
+
+def test_merge_localizations_blinking():
+    rng = np.random.default_rng(0)
+    # emitters on a grid (far apart), each blinking in frames t, t+1 and t+3 (one dark frame)
+    emitters = np.stack(np.meshgrid(np.arange(10), np.arange(10), indexing="ij"), axis=-1).reshape((-1, 2)) * 1000.0
+    n = len(emitters)
+    start = rng.integers(0, 100, n)
+    blinks = np.array([0, 1, 3])
+    emitter = np.repeat(np.arange(n), len(blinks))
+    frames = start[emitter] + np.tile(blinks, n)
+    sigmas = rng.uniform(5, 15, (len(emitter), 2))
+    coords = emitters[emitter] + rng.normal(0, 1, sigmas.shape) * sigmas
+    photons = rng.uniform(100, 1000, len(emitter))
+
+    # shuffled input
+    perm = rng.permutation(len(emitter))
+    emitter, frames, sigmas, coords, photons = emitter[perm], frames[perm], sigmas[perm], coords[perm], photons[perm]
+
+    merged, merged_sigmas, values, labels = merge_localizations(
+        coords, frames, sigmas=sigmas, values=photons, radius=100, max_gap=1
+    )
+    # one merged particle per emitter
+    assert len(merged) == n
+    for e in range(n):
+        i = np.flatnonzero(emitter == e)
+        (label,) = np.unique(labels[i])
+        w = 1 / sigmas[i] ** 2
+        assert np.allclose(merged[label], np.sum(w * coords[i], axis=0) / np.sum(w, axis=0))
+        assert np.allclose(merged_sigmas[label], 1 / np.sqrt(np.sum(w, axis=0)))
+        assert np.isclose(values[label], photons[i].sum())
+        # more precise than every single localization
+        assert np.all(merged_sigmas[label] < sigmas[i].min(axis=0))
+
+
+def test_merge_localizations_gap():
+    coords = np.zeros((4, 2))
+    frames = np.array([0, 1, 3, 6])
+    # frame 3 follows a single dark frame, frame 6 two
+    _, _, counts, labels = merge_localizations(coords, frames, radius=10, max_gap=1)
+    assert labels[0] == labels[1] == labels[2] != labels[3]
+    assert sorted(counts) == [1, 3]
+    _, _, counts, labels = merge_localizations(coords, frames, radius=10, max_gap=0)
+    assert labels[0] == labels[1] and len(np.unique(labels)) == 3
+    # localizations further apart than the radius are not merged
+    _, _, counts, _ = merge_localizations([[0, 0], [0, 20]], [0, 1], radius=10)
+    assert np.array_equal(counts, [1, 1])
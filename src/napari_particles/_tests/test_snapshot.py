@@ -0,0 +1,51 @@
+import numpy as np
+from napari_particles.particles import Particles
+
+
+def test_snapshot_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 500
+    coords = rng.uniform(0, 100, (n, 3))
+    values = rng.uniform(0, 1, n)
+    colors = rng.integers(0, 256, (n, 4)).astype(np.uint8)
+    properties = dict(frame=np.arange(n), photons=rng.uniform(0, 1e4, n))
+    layer = Particles(
+        coords,
+        values=values,
+        colors=colors,
+        properties=properties,
+        size=rng.uniform(1, 2, n),
+        reorder="morton",
+        slab_thickness=5,
+        slab_projection="max",
+        colormap="magma",
+    )
+    layer.save_snapshot(str(tmp_path))
+
+    for mmap in (True, False):
+        loaded = Particles.load_snapshot(str(tmp_path), mmap=mmap)
+        assert np.array_equal(loaded.order, layer.order)
+        assert np.array_equal(loaded.attributes["coords"], coords)
+        assert np.array_equal(loaded.values, values)
+        assert np.array_equal(loaded.size, layer.size)
+        assert np.array_equal(loaded.colors, colors)
+        for k, v in properties.items():
+            # properties keep their dtype
+            assert loaded.attributes[k].dtype == v.dtype
+            assert np.array_equal(loaded.attributes[k], v)
+        assert loaded.slab_thickness == 5 and loaded.slab_projection == "max"
+        assert loaded.colormap.name == layer.colormap.name
+        assert np.array_equal(loaded._vertex_layout, layer._vertex_layout)
+
+    # the loaded layer keeps reordering new particles
+    loaded.set_particles(coords[::-1], values=values[::-1])
+    assert loaded.order is not None
+    assert np.array_equal(loaded.values, values[::-1])
+
+
+def test_snapshot_overrides(tmp_path):
+    layer = Particles(np.zeros((10, 3)), slab_thickness=5)
+    layer.save_snapshot(str(tmp_path))
+    loaded = Particles.load_snapshot(str(tmp_path), slab_thickness=2, name="copy")
+    assert loaded.slab_thickness == 2 and loaded.name == "copy"
+    assert loaded.order is None
@@ -0,0 +1,18 @@
+import numpy as np
+from napari_particles.spatial import morton_codes, morton_order
+
+
+def test_morton_order_sorts_codes():
+    coords = np.random.default_rng(0).uniform(0, 100, (5000, 3))
+    order = morton_order(coords)
+    assert np.array_equal(np.sort(order), np.arange(len(coords)))
+    assert np.all(np.diff(morton_codes(coords)[order].astype(np.int64)) >= 0)
+
+
+def test_morton_order_is_local():
+    # points of the same octant are contiguous
+    coords = np.random.default_rng(0).uniform(0, 1, (5000, 3))
+    # the bounding box is the unit cube
+    coords[:2] = [[0], [1]]
+    octant = (coords > 0.5) @ [4, 2, 1]
+    assert np.count_nonzero(np.diff(octant[morton_order(coords)])) == 7
@@ -0,0 +1,21 @@
+import numpy as np
+from napari_particles.particles import Particles
+from napari_particles.system import ParticleSystem
+
+
+def test_step_updates_the_slab_index(viewer):
+    rng = np.random.default_rng(0)
+    system = ParticleSystem(1000, lifetime=100)
+    system.emit(rng.uniform(0, 100, (1000, 3)), velocities=(20, 0, 0))
+    layer = Particles.from_system(system, size=1, slab_thickness=10)
+    layer.add_to_viewer(viewer)
+    viewer.dims.set_point(0, 50)
+
+    layer.step(1.0)
+    drawn = layer._view_faces[::2, 0] // 4
+    z = layer._coords[drawn, 0]
+    assert len(drawn) > 0
+    assert np.all(np.abs(z - 50) <= 5)
+    # all particles within the slab are drawn
+    inside = np.abs(layer._coords[:, 0] - 50) <= 5
+    assert len(drawn) == np.count_nonzero(inside & system.alive)
@@ -0,0 +1,20 @@
+import numpy as np
+from napari_particles.tiles import TiledDataset, TiledParticles, write_tiled
+
+
+def test_tiled_particles(tmp_path):
+    rng = np.random.default_rng(0)
+    coords = rng.uniform(0, 100, (1000, 3)).astype(np.float32)
+    values = rng.uniform(0, 1, len(coords)).astype(np.float32)
+    write_tiled(str(tmp_path), coords, tile_size=25, size=np.ones(len(coords)), values=values)
+
+    layer = TiledParticles(str(tmp_path))
+    assert isinstance(layer.dataset, TiledDataset)
+    assert len(layer.dataset) == 4 ** 3
+    assert len(layer._coords) == 0
+
+    # the tiles are loaded into the (layer) buffers
+    data = layer.dataset.get(range(len(layer.dataset)))
+    layer.set_particles(data.pop("coords"), size=data.pop("size"), values=data.pop("values"))
+    assert len(layer._coords) == len(coords)
+    assert np.allclose(np.sort(layer.values), np.sort(values))
@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from napari_particles import utils
+from napari_particles.utils import (
+    billboard_template, generate_billboards_2d, pack_rgba8, repeat_rows, rgba8_to_vec2, rotvec_to_quatvec
+)
+
+# larger than the chunk size, such that several workers are used
+N = 200000
+
+
+@pytest.mark.parametrize("ndim", [2, 3])
+def test_generate_billboards_parallel(ndim):
+    rng = np.random.default_rng(0)
+    coords = rng.uniform(0, 100, (N, ndim))
+    size = rng.uniform(1, 2, N)
+    serial = generate_billboards_2d(coords, size=size, workers=1)
+    parallel = generate_billboards_2d(coords, size=size, workers=4)
+    for a, b in zip(serial, parallel):
+        assert a.dtype == b.dtype
+        assert np.array_equal(a, b)
+
+
+@pytest.mark.parametrize("repeats", [1, 4])
+def test_repeat_rows_parallel(repeats):
+    x = np.random.default_rng(0).uniform(0, 1, (N, 3)).astype(np.float32)
+    expected = np.repeat(x, repeats, axis=0)
+    assert np.array_equal(repeat_rows(x, repeats, workers=1), expected)
+    assert np.array_equal(repeat_rows(x, repeats, workers=4), expected)
+    out = np.empty_like(expected)
+    repeat_rows(x, repeats, workers=4, out=out)
+    assert np.array_equal(out, expected)
+
+
+def test_rotvec_to_quatvec_parallel():
+    p = np.random.default_rng(0).normal(0, 1, (N, 3))
+    serial = rotvec_to_quatvec(p, workers=1)
+    assert np.array_equal(serial, rotvec_to_quatvec(p, workers=4))
+    assert np.array_equal(serial, rotvec_to_quatvec(p, workers=None))
+
+
+@pytest.fixture
+def empty_template_cache(monkeypatch):
+    monkeypatch.setitem(utils._template_cache, "faces", None)
+    monkeypatch.setitem(utils._template_cache, "texcoords", None)
+
+
+def _check_template(faces, texcoords, n):
+    expected_faces, expected_texcoords = utils._generate_template(n)
+    assert np.array_equal(faces, expected_faces) and np.array_equal(texcoords, expected_texcoords)
+    assert not faces.flags.writeable and not texcoords.flags.writeable
+
+
+def test_billboard_template_cache(empty_template_cache):
+    faces, texcoords = billboard_template(10)
+    _check_template(faces, texcoords, 10)
+    cached = utils._template_cache["faces"]
+    assert len(cached) == 2 * 10
+
+    # smaller requests are prefix views of the cache
+    faces, texcoords = billboard_template(4)
+    _check_template(faces, texcoords, 4)
+    assert np.shares_memory(faces, cached)
+
+    # the cache grows geometrically
+    faces, texcoords = billboard_template(15)
+    _check_template(faces, texcoords, 15)
+    assert len(utils._template_cache["faces"]) == 2 * 20
+
+
+def test_billboard_template_bypass(empty_template_cache, monkeypatch):
+    billboard_template(10)
+    bytes_per_billboard = utils._faces0.nbytes + utils._texcoords0.nbytes
+    monkeypatch.setattr(utils, "TEMPLATE_CACHE_BYTES", 100 * bytes_per_billboard)
+    faces, texcoords = billboard_template(101)
+    _check_template(faces, texcoords, 101)
+    # too large requests drop the cache
+    assert utils._template_cache["faces"] is None
+    faces, texcoords = billboard_template(100)
+    _check_template(faces, texcoords, 100)
+    assert len(utils._template_cache["faces"]) == 2 * 100
+
+
+def test_billboard_template_threads(empty_template_cache):
+    sizes = np.random.default_rng(0).integers(0, 5000, 64)
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(billboard_template, sizes))
+    for n, (faces, texcoords) in zip(sizes, results):
+        _check_template(faces, texcoords, n)
+
+
+def unpack_vec2(pairs):
+    """inverse of `rgba8_to_vec2` (like the billboard vertex shader)"""
+    pairs = pairs.astype(np.int64)
+    return np.stack([pairs[:, 0] // 256, pairs[:, 0] % 256, pairs[:, 1] // 256, pairs[:, 1] % 256], axis=-1)
+
+
+def test_rgba8_round_trip():
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 256, (1000, 4), dtype=np.uint8)
+    packed = pack_rgba8(colors, 1000)
+    assert packed.dtype == np.uint8 and np.array_equal(packed, colors)
+    pairs = rgba8_to_vec2(packed)
+    assert pairs.dtype == np.float32 and pairs.shape == (1000, 2)
+    # the pairs are exact integers
+    assert np.array_equal(pairs, np.round(pairs))
+    assert np.array_equal(unpack_vec2(pairs), colors)
+    # floats in [0, 1]
+    assert np.array_equal(pack_rgba8(colors / 255, 1000), colors)
+
+
+def test_pack_rgba8_single_and_named_colors():
+    assert np.array_equal(pack_rgba8("red", 3), np.tile([255, 0, 0, 255], (3, 1)))
+    assert np.array_equal(pack_rgba8(["red", "blue"], 2), [[255, 0, 0, 255], [0, 0, 255, 255]])
+    # RGB gets an opaque alpha, out of range floats are clipped
+    assert np.array_equal(pack_rgba8((0, 0.5, 2), 2), np.tile([0, 128, 255, 255], (2, 1)))
+    with pytest.raises(ValueError):
+        pack_rgba8(np.zeros((3, 4)), 2)
+    with pytest.raises(ValueError):
+        pack_rgba8(np.zeros((2, 2)), 2)
@@ -0,0 +1,22 @@
+import numpy as np
+from napari_particles.particles import Particles
+
+
+def _flush_callbacks(layer):
+    # (weak reference, method name) pairs
+    callbacks = layer._canvas.events.draw.callbacks
+    return [c for c in callbacks if isinstance(c, tuple) and c[0]() is layer and c[1] == "_flush_billboard_update"]
+
+
+def test_removing_the_layer_disconnects_the_draw_handler(viewer):
+    layer = Particles(np.random.default_rng(0).uniform(0, 100, (100, 3)))
+    layer.add_to_viewer(viewer)
+    assert len(_flush_callbacks(layer)) == 1
+
+    viewer.layers.remove(layer)
+    assert len(_flush_callbacks(layer)) == 0
+    assert not layer._billboard_filter._attached
+
+    layer.add_to_viewer(viewer)
+    assert len(_flush_callbacks(layer)) == 1
+    assert layer._billboard_filter._attached
@@ -1,11 +1,13 @@
+import functools
 import numpy as np
+from typing import Optional
 from vispy.visuals.filters import Filter
 from vispy.visuals.shaders import Function, Varying
 from vispy.gloo import VertexBuffer
 
 
 
-quat_mult = Function("""
+_QUATERNION_MULT = """
     vec4 quaternion_mult(vec4 p, vec4 q){
 
         float s = p.w*q.w - dot(p.xyz, q.xyz); 
@@ -13,27 +15,27 @@ quat_mult = Function("""
         return float4(s, r.xyz);
         
     }
-    """)
+    """
 
 
-quaternion_rot3 = Function("""
+_QUATERNION_ROT3 = """
     // https://fgiesen.wordpress.com/2019/02/09/rotating-a-single-vector-using-a-quaternion/
     vec3 quaternion_rot3(vec4 q, vec3 r){
 
         vec3 t = 2*cross(q.xyz, r);
         return r + q.w*t + cross(q.xyz, t);
     }
-    """)
+    """
 
-quaternion_rot4 = Function("""
+_QUATERNION_ROT4 = """
     vec4 quaternion_rot4(vec4 q, vec4 r){
 
         vec3 t = 2*cross(q.xyz, r.xyz);
         return vec4(r.xyz + q.w*t + cross(q.xyz, t), 0);
     }
-    """)
+    """
 
-quaternion_mat3 = Function("""
+_QUATERNION_MAT3 = """
     mat3 quaternion_mat3(vec4 q){
 
     float x2 = q.x * q.x; 
@@ -50,9 +52,9 @@ quaternion_mat3 = Function("""
                 2. * (xy + wz), 1. - 2. * (x2 + z2), 2. * (yz - wx), 
                 2. * (xz - wy), 2. * (yz + wx), 1. - 2. * (x2 + y2));
     }
-    """)
+    """
 
-quaternion_mat4 = Function("""
+_QUATERNION_MAT4 = """
     mat4 quaternion_mat4(vec4 q){
 
     float x2 = q.x * q.x; 
@@ -72,7 +74,72 @@ quaternion_mat4 = Function("""
                 0., 0., 0., 1.);
 
     }
-    """)
+    """
+
+
+_UNPACK_COLOR = """
+    vec4 unpack_color(vec2 rgba){
+        // two 8 bit channels per (exact integer) float, see `rgba8_to_vec2`
+        vec2 hi = floor(rgba / 256.);
+        vec2 lo = rgba - 256. * hi;
+        return vec4(hi.x, lo.x, hi.y, lo.y) / 255.;
+    }
+    """
+
+
+@functools.lru_cache(maxsize=None)
+def _quaternion_functions() -> dict:
+    """the quaternion shader functions (created on first use and shared by all filters)"""
+    return dict(
+        quaternion_rot3=Function(_QUATERNION_ROT3),
+        quaternion_rot4=Function(_QUATERNION_ROT4),
+        quaternion_mat3=Function(_QUATERNION_MAT3),
+        quaternion_mat4=Function(_QUATERNION_MAT4),
+    )
+
+
+def _field(n):
+    # every attribute is a nested single field struct, such that views into the
+    # interleaved buffer report the right glsl type (float, vec2, vec3)
+    return np.dtype([("f0", np.float32, n)]) if n > 1 else np.dtype([("f0", np.float32)])
+
+
+# layout of the interleaved per vertex buffer (float32, in GL axis order)
+VERTEX_DTYPE = np.dtype(
+    [
+        ("centercoords", _field(3)),
+        ("sigmas", _field(3)),
+        ("quatvec", _field(3)),
+        ("texcoords", _field(2)),
+        ("scale", _field(1)),
+    ]
+)
+
+# layout of the keyframe buffers (see `BillboardsFilter.set_keyframe`)
+KEYFRAME_DTYPE = np.dtype(
+    [
+        ("centercoords", _field(3)),
+        ("sigmas", _field(3)),
+    ]
+)
+
+
+def vertex_layout(n: int) -> np.ndarray:
+    """An (uninitialized) interleaved array of n vertices"""
+    return np.empty(n, dtype=VERTEX_DTYPE)
+
+
+def vertex_field(data: np.ndarray, name: str) -> np.ndarray:
+    """A (writable) view of one attribute of an interleaved array in napari axis order"""
+    x = data[name]["f0"]
+    return x[:, ::-1] if x.ndim == 2 else x
+
+
+# shader variable -> buffer field
+_VERTEX_VARIABLES = dict(
+    vertex_center="centercoords", sigmas="sigmas", quatvec="quatvec", texcoords="texcoords", scale="scale"
+)
+
 
 class BillboardsFilter(Filter):
     """Billboard geometry filter (transforms vertices to always face camera)"""
@@ -91,13 +158,21 @@ class BillboardsFilter(Filter):
         varying float v_z_center;
         varying float v_scale_intensity;
         varying mat2 covariance_inv;
+        varying vec4 v_color;
 
         void apply(){            
+            // interpolation between two keyframes (both are the same buffer without keyframes)
+            vec3 vertex_center = mix($vertex_center, $next_center, $keyframe_t);
+            vec3 sigmas = mix($sigmas, $next_sigmas, $keyframe_t);
+
             // original world coordinates of the (constant) particle squad, e.g. [5,5] for size 5 
             vec4 pos = $transform_inv(gl_Position);
 
             pos.z *= pos.w; 
 
+            // per particle scale of the quad (0 for hidden particles)
+            pos.xy *= $scale;
+
             float quat_w = length($quatvec);
             quat_w = sqrt(1-quat_w*quat_w);
             vec4 quat = vec4($quatvec,quat_w);
@@ -118,9 +193,9 @@ class BillboardsFilter(Filter):
 
             mat4 cov = mat4(1.0);            
             
-            cov[0][0] = sqrt($sigmas[0]);
-            cov[1][1] = sqrt($sigmas[1]);
-            cov[2][2] = sqrt($sigmas[2]);
+            cov[0][0] = sqrt(sigmas[0]);
+            cov[1][1] = sqrt(sigmas[1]);
+            cov[2][2] = sqrt(sigmas[2]);
 
             cov = transpose(quatmat)*cov*quatmat;
 
@@ -159,8 +234,8 @@ class BillboardsFilter(Filter):
             camera_right = camera_right/len;
             camera_up    = camera_up/len;                      
 
-            vec4 p1 = $transform(vec4($vertex_center.xyz + camera_right*pos.x + camera_up*pos.y, 1.));
-            vec4 p2 = $transform(vec4($vertex_center,1));
+            vec4 p1 = $transform(vec4(vertex_center.xyz + camera_right*pos.x + camera_up*pos.y, 1.));
+            vec4 p2 = $transform(vec4(vertex_center,1));
             float dist = length(p1.xy/p1.w-p2.xy/p2.w); 
 
             
@@ -176,9 +251,9 @@ class BillboardsFilter(Filter):
                 v_scale_intensity = scale;
                 
             }
-            vec3 pos_real  = $vertex_center.xyz + camera_right*pos.x + camera_up*pos.y;
+            vec3 pos_real  = vertex_center.xyz + camera_right*pos.x + camera_up*pos.y;
             gl_Position = $transform(vec4(pos_real, 1.));            
-            vec4 center = $transform(vec4($vertex_center,1));
+            vec4 center = $transform(vec4(vertex_center,1));
             v_z_center = center.z/center.w;
 
 
@@ -187,6 +262,9 @@ class BillboardsFilter(Filter):
             
             $v_texcoords = vec2(tex.y, tex.x);
 
+            // per particle color (only used if set, see `set_colors`)
+            v_color = $unpack_color($color);
+
             }
         """
         )
@@ -195,10 +273,14 @@ class BillboardsFilter(Filter):
             """
         varying float v_scale_intensity;
         varying float v_z_center;
+        varying vec4 v_color;
         
         void apply() {   
             gl_FragDepth = v_z_center;
             $texcoords;
+            // replaces the colormapped values (before any shader/texture filter is applied)
+            if ($use_colors > 0.5)
+                gl_FragColor = v_color;
         }
         """
         )
@@ -208,78 +290,203 @@ class BillboardsFilter(Filter):
         vfunc["v_texcoords"] = self._texcoord_varying
         ffunc["texcoords"] = self._texcoord_varying
 
-        self._texcoords_buffer = VertexBuffer(np.zeros((0, 2), dtype=np.float32))
-        vfunc["texcoords"] = self._texcoords_buffer
         vfunc["antialias"] = float(antialias)
+        vfunc["keyframe_t"] = 0.0
+        vfunc["unpack_color"] = Function(_UNPACK_COLOR)
+        vfunc["color"] = (0.0, 0.0)
+        ffunc["use_colors"] = 0.0
+
+        # a single interleaved buffer holding all per vertex attributes
+        self._vertex_data = np.zeros(0, dtype=VERTEX_DTYPE)
+        self._vertex_buffer = VertexBuffer(self._vertex_data)
+        # two keyframe buffers (used alternately as current and next keyframe)
+        self._keyframe_buffers = [VertexBuffer(np.zeros(0, dtype=KEYFRAME_DTYPE)) for _ in range(2)]
+        self._keyframe_current = 0
+        self._keyframes = False
+        # packed per vertex colors (see `set_colors`)
+        self._color_buffer = VertexBuffer(np.zeros((0, 2), dtype=np.float32))
+        self._colors = False
+
+        for name, func in _quaternion_functions().items():
+            vfunc[name] = func
+
+        # fpos=1: runs before the (default position) shader and texture filters
+        super().__init__(vcode=vfunc, vhook="post", fcode=ffunc, fhook="post", fpos=1)
+        self._bind_vertex_buffer()
+
+    def _bind_vertex_buffer(self):
+        # views into the interleaved buffer become invalid whenever it is resized
+        for var, name in _VERTEX_VARIABLES.items():
+            self.vshader[var] = self._vertex_buffer[name]
+        if self._keyframes:
+            current = self._keyframe_buffers[self._keyframe_current]
+            following = self._keyframe_buffers[1 - self._keyframe_current]
+            self.vshader["vertex_center"] = current["centercoords"]
+            self.vshader["sigmas"] = current["sigmas"]
+        else:
+            following = self._vertex_buffer
+        self.vshader["next_center"] = following["centercoords"]
+        self.vshader["next_sigmas"] = following["sigmas"]
+
+    @property
+    def keyframes(self) -> bool:
+        """Whether centers and sigmas are interpolated between the two keyframe buffers"""
+        return self._keyframes
 
-        self._centercoords_buffer = VertexBuffer(np.zeros((0, 3), dtype=np.float32))
-        self._sigmas_buffer = VertexBuffer(np.zeros((0, 3), dtype=np.float32))
-        self._quatvec_buffer = VertexBuffer(np.zeros((0, 3), dtype=np.float32))
+    @keyframes.setter
+    def keyframes(self, enabled: bool):
+        self._keyframes = bool(enabled)
+        if not self._keyframes:
+            self.keyframe_t = 0.0
+        self._bind_vertex_buffer()
 
-        vfunc["vertex_center"] = self._centercoords_buffer
-        vfunc["sigmas"] = self._sigmas_buffer
-        vfunc["quatvec"] = self._quatvec_buffer
-        vfunc["quaternion_rot3"] = quaternion_rot3
-        vfunc["quaternion_rot4"] = quaternion_rot4
-        vfunc["quaternion_mat3"] = quaternion_mat3
-        vfunc["quaternion_mat4"] = quaternion_mat4
+    @property
+    def keyframe_t(self) -> float:
+        """The interpolation parameter between the current (0) and the next (1) keyframe"""
+        return self.vshader["keyframe_t"].value
+
+    @keyframe_t.setter
+    def keyframe_t(self, t: float):
+        # a uniform: no upload and no recompilation
+        self.vshader["keyframe_t"] = float(t)
+
+    def set_keyframe(self, data: np.ndarray, current: bool = False):
+        """Uploads the next (or current) keyframe
+
+        Parameters
+        ----------
+        data : np.ndarray
+            array of dtype KEYFRAME_DTYPE with one row per drawn vertex
+        current : bool, optional
+            whether to set the current instead of the next keyframe, by default False
+        """
+        slot = self._keyframe_current if current else 1 - self._keyframe_current
+        resized = self._keyframe_buffers[slot].size != len(data)
+        self._keyframe_buffers[slot].set_data(data)
+        if resized and self._keyframes:
+            self._bind_vertex_buffer()
+
+    def swap_keyframes(self):
+        """Makes the next keyframe the current one (whose buffer then takes the following keyframe)"""
+        self._keyframe_current = 1 - self._keyframe_current
+        if self._keyframes:
+            self._bind_vertex_buffer()
 
-        super().__init__(vcode=vfunc, vhook="post", fcode=ffunc, fhook="post")
+    @property
+    def colors(self) -> bool:
+        """Whether the drawn vertices have own colors (instead of the colormapped values)"""
+        return self._colors
+
+    def set_colors(self, colors: Optional[np.ndarray]):
+        """Uploads the packed colors of all drawn vertices
+
+        Parameters
+        ----------
+        colors : np.ndarray, optional
+            float32 array of shape (N, 2) with one packed color per drawn vertex (see `rgba8_to_vec2`), 
+            None to use the colormapped values again
+        """
+        if colors is None:
+            self.vshader["color"] = (0.0, 0.0)
+            self.fshader["use_colors"] = 0.0
+            self._colors = False
+            return
+        self._color_buffer.set_data(np.asarray(colors, dtype=np.float32))
+        if not self._colors:
+            self.vshader["color"] = self._color_buffer
+            self.fshader["use_colors"] = 1.0
+            self._colors = True
+
+    def set_vertex_data(self, source: np.ndarray, index: np.ndarray, offset: Optional[int] = None):
+        """Gathers the rows `index` of an interleaved `source` array into the drawn vertices and uploads them
+
+        Parameters
+        ----------
+        source : np.ndarray
+            array of dtype VERTEX_DTYPE, e.g. one row per mesh vertex (see `vertex_layout`), or a
+            compact layout that writes the (dequantized) rows itself (see `QuantizedLayout.gather`)
+        index : np.ndarray
+            the source row of every drawn vertex
+        offset : int, optional
+            if given, only the drawn vertices offset,...,offset+len(index)-1 are set, 
+            by default None (setting all vertices)
+        """
+        if offset is None:
+            offset = 0
+            if len(index) != len(self._vertex_data):
+                self._vertex_data = np.empty(len(index), dtype=VERTEX_DTYPE)
+        stop = offset + len(index)
+        if isinstance(source, np.ndarray):
+            # a single pass over whole records, much faster than per attribute (strided) copies
+            np.take(source, index, out=self._vertex_data[offset:stop], mode="clip")
+        else:
+            source.gather(index, out=self._vertex_data[offset:stop])
+        self._upload_vertex_data(offset, stop)
+
+    def _upload_vertex_data(self, start: int = 0, stop: Optional[int] = None):
+        if not (self._attached and self._visual is not None):
+            return
+        stop = len(self._vertex_data) if stop is None else stop
+        if start == 0 and stop == len(self._vertex_data):
+            resized = self._vertex_buffer.size != len(self._vertex_data)
+            # already laid out as float32 records: a contiguous transfer without conversion
+            self._vertex_buffer.set_data(self._vertex_data)
+            if resized:
+                self._bind_vertex_buffer()
+        elif stop > start:
+            self._vertex_buffer.set_subdata(self._vertex_data[start:stop], offset=start)
+
+    def _set_vertex_attribute(self, name, x):
+        x = np.asarray(x)
+        if len(x) != len(self._vertex_data):
+            self._vertex_data = np.zeros(len(x), dtype=VERTEX_DTYPE)
+        vertex_field(self._vertex_data, name)[:] = x
+        self._upload_vertex_data()
 
     @property
     def centercoords(self):
         """The vertex center coordinates as an (N, 3) array of floats."""
-        return self._centercoords
+        return vertex_field(self._vertex_data, "centercoords")
 
     @centercoords.setter
     def centercoords(self, centercoords):
-        self._centercoords = centercoords
-        self._update_coords_buffer(centercoords)
-
-    def _update_coords_buffer(self, centercoords):
-        if self._attached and self._visual is not None:
-            self._centercoords_buffer.set_data(centercoords[:, ::-1], convert=True)
+        self._set_vertex_attribute("centercoords", centercoords)
 
     @property
     def sigmas(self):
-        """The vertex center coordinates as an (N, 3) array of floats."""
-        return self._sigmas
+        """The vertex sigmas as an (N, 3) array of floats."""
+        return vertex_field(self._vertex_data, "sigmas")
 
     @sigmas.setter
     def sigmas(self, sigmas):
-        self._sigmas = sigmas
-        self._update_sigmas_buffer(sigmas)
-
-    def _update_sigmas_buffer(self, sigmas):
-        if self._attached and self._visual is not None:
-            self._sigmas_buffer.set_data(sigmas[:, ::-1], convert=True)
+        self._set_vertex_attribute("sigmas", sigmas)
 
     @property
     def quatvec(self):
-        return self._quatvec
+        """The vertex quaternion vectors as an (N, 3) array of floats."""
+        return vertex_field(self._vertex_data, "quatvec")
 
     @quatvec.setter
     def quatvec(self, quatvec):
-        self._quatvec = quatvec
-        self._update_quatvec_buffer(quatvec)
+        self._set_vertex_attribute("quatvec", quatvec)
+
+    @property
+    def scale(self):
+        """The per vertex scale of the quads as an (N,) array of floats."""
+        return vertex_field(self._vertex_data, "scale")
 
-    def _update_quatvec_buffer(self, quatvec):
-        if self._attached and self._visual is not None:
-            self._quatvec_buffer.set_data(quatvec[:, ::-1], convert=True)
+    @scale.setter
+    def scale(self, scale):
+        self._set_vertex_attribute("scale", scale)
 
     @property
     def texcoords(self):
         """The texture coordinates as an (N, 2) array of floats."""
-        return self._texcoords
+        return vertex_field(self._vertex_data, "texcoords")
 
     @texcoords.setter
     def texcoords(self, texcoords):
-        self._texcoords = texcoords
-        self._update_texcoords_buffer(texcoords)
-
-    def _update_texcoords_buffer(self, texcoords):
-        if self._attached or self._visual is not None:
-            self._texcoords_buffer.set_data(texcoords[:, ::-1], convert=True)
+        self._set_vertex_attribute("texcoords", texcoords)
 
     def _attach(self, visual):
 
@@ -0,0 +1,111 @@
+"""
+Loading of astronomical catalogues (e.g. Gaia) as particle coordinates
+
+"""
+
+from typing import Iterator, Optional, Tuple
+import numpy as np
+
+# rotation from ICRS to galactic cartesian coordinates, the columns are reversed
+# such that the result is directly in (z, y, x) order
+# https://gea.esac.esa.int/archive/documentation/GDR2/Data_processing/chap_cu3ast/sec_cu3ast_intro/ssec_cu3ast_intro_tansforms.html
+A_GALACTIC = np.array([[-0.0548755604162154, 0.4941094278755837, -0.8676661490190047],
+                       [-0.8734370902348850, -0.4448296299600112, -0.1980763734312015],
+                       [-0.4838350155487132, 0.7469822444972189, 0.4559837761750669]])
+
+_ICRS_TO_GALACTIC_ZYX = A_GALACTIC[:, ::-1]
+
+
+def radec_to_galactic(
+    ra: np.ndarray, dec: np.ndarray, parallax: np.ndarray, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Converts ra/dec (in degree) and parallax (in mas) to galactic cartesian coordinates (in kpc)
+
+    Returns an array of shape (N, 3) in (z, y, x) order, written into out (float32 by default) if given
+    """
+    ra = np.radians(ra)
+    dec = np.radians(dec)
+    r = 1 / np.asarray(parallax, dtype=np.float64)
+    cos_dec = np.cos(dec)
+    xyz = np.stack([r * np.cos(ra) * cos_dec, r * np.sin(ra) * cos_dec, r * np.sin(dec)], axis=-1)
+    if out is None:
+        out = np.empty((len(r), 3), dtype=np.float32)
+    out[:] = xyz @ _ICRS_TO_GALACTIC_ZYX
+    return out
+
+
+def absolute_magnitude(mag: np.ndarray, parallax: np.ndarray) -> np.ndarray:
+    """Absolute magnitude from apparent magnitude and parallax (in mas)"""
+    return mag - 5 * (np.log10(1000 / parallax) - 1)
+
+
+def magnitude_to_brightness(mag: np.ndarray, mag_range: Tuple[float, float]) -> np.ndarray:
+    """Maps magnitudes to brightness values in [0, 1] (brighter objects have smaller magnitudes)"""
+    mi, ma = mag_range
+    return (1 - np.clip((mag - mi) / (ma - mi), 0, 1)).astype(np.float32)
+
+
+def iter_catalog(
+    fname: str,
+    chunksize: int = 10**6,
+    step: int = 1,
+    min_parallax: float = 0,
+    columns: Tuple[str, str, str, str] = ("ra", "dec", "parallax", "phot_g_mean_mag"),
+    **kwargs,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Streams a catalogue csv file chunk by chunk
+
+    Rows are first subsampled (every step-th row of the file), then rows with a parallax
+    <= min_parallax are discarded. The coordinates and absolute magnitudes of every kept
+    row are computed from its own parallax, i.e. the subsampling never mixes rows.
+
+    Parameters
+    ----------
+    fname : str
+        the csv file
+    chunksize : int, optional
+        number of rows read at once, by default 10**6
+    step : int, optional
+        only use every step-th row of the file (applied before min_parallax), by default 1
+    min_parallax : float, optional
+        discard (the subsampled) rows with parallax <= min_parallax, by default 0
+    columns : Tuple[str, str, str, str], optional
+        the names of the ra, dec, parallax and (apparent) magnitude columns
+    **kwargs :
+        passed to pandas.read_csv
+
+    Yields
+    ------
+    coords : np.ndarray
+        galactic cartesian coordinates (z, y, x) of shape (M, 3) and dtype float32
+    mag_abs : np.ndarray
+        absolute magnitudes of shape (M,) and dtype float32
+    """
+    import pandas as pd
+
+    offset = 0
+    for df in pd.read_csv(fname, usecols=list(columns), chunksize=chunksize, **kwargs):
+        # global row index based subsampling (independent of the chunk size)
+        start = (-offset) % step
+        offset += len(df)
+        ra, dec, parallax, mag = (df[c].to_numpy()[start::step] for c in columns)
+        m = parallax > min_parallax
+        ra, dec, parallax, mag = ra[m], dec[m], parallax[m], mag[m]
+        yield radec_to_galactic(ra, dec, parallax), absolute_magnitude(mag, parallax).astype(np.float32)
+
+
+def load_catalog(fname: str, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
+    """Loads a whole catalogue csv file (see iter_catalog)
+
+    Returns
+    -------
+    coords : np.ndarray
+        galactic cartesian coordinates (z, y, x) of shape (N, 3) and dtype float32
+    mag_abs : np.ndarray
+        absolute magnitudes of shape (N,) and dtype float32
+    """
+    chunks = list(iter_catalog(fname, **kwargs))
+    if len(chunks) == 0:
+        return np.zeros((0, 3), np.float32), np.zeros(0, np.float32)
+    coords, mag_abs = zip(*chunks)
+    return np.concatenate(coords), np.concatenate(mag_abs)
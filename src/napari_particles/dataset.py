@@ -0,0 +1,124 @@
+"""
+Particle data shared by several layers
+
+A `ParticleDataset` holds the prepared host buffers of a set of particles (coordinates,
+sizes, sigmas, rotations and the interleaved vertex layout). Several `Particles` layers
+can show the same dataset with their own shading, mask, colormap and values, while the
+buffers stay resident only once.
+
+"""
+
+import weakref
+import numpy as np
+
+
+class _Shared:
+    """Layer attribute that is stored in (and shared via) the layer's dataset"""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj._dataset, self.name)
+
+    def __set__(self, obj, value):
+        setattr(obj._dataset, self.name, value)
+
+
+# layer attributes that live in the dataset
+_SHARED_ATTRIBUTES = (
+    "_coords",
+    "_size",
+    "_sigmas",
+    "_rotvec",
+    "_mytexcoords",
+    "_vertex_layout",
+    "_centercoords",
+    "_quatvec",
+    "_scale",
+    "_properties",
+    "_system",
+    "_z_order",
+    "_z_sorted",
+    "_extent",
+    "_grid_hash",
+    "_order",
+)
+
+
+def shared_attributes(cls):
+    """class decorator that routes all `_SHARED_ATTRIBUTES` of a layer class to its dataset"""
+    for name in _SHARED_ATTRIBUTES:
+        attr = _Shared()
+        attr.__set_name__(cls, name)
+        setattr(cls, name, attr)
+    return cls
+
+
+class ParticleDataset:
+    """Prepared particle buffers that can be shown by several layers
+
+    Create further layers of an existing layer's data with `Particles.from_dataset(layer.dataset)`.
+    The dataset keeps track of all layers using it (without keeping them alive), changes
+    of shared attributes (e.g. `size`) are then uploaded for all of them.
+    """
+
+    def __init__(self):
+        # (vertices, faces, values) of the surface layers
+        self._data = None
+        # spatial hash of the coordinates (see `Particles.set_local_density`)
+        self._grid_hash = None
+        # the input row of every particle (if reordered, see `Particles.order`)
+        self._order = None
+        self._layers = weakref.WeakSet()
+
+    def _attach(self, layer):
+        self._layers.add(layer)
+
+    def _detach(self, layer):
+        self._layers.discard(layer)
+
+    @property
+    def layers(self) -> list:
+        """All (alive) layers using this dataset"""
+        return list(self._layers)
+
+    @property
+    def n_layers(self) -> int:
+        """The number of layers using this dataset"""
+        return len(self._layers)
+
+    def __len__(self) -> int:
+        return len(self._coords)
+
+    @property
+    def nbytes(self) -> int:
+        """The host memory of all shared buffers (in bytes)"""
+        arrays = [getattr(self, name, None) for name in _SHARED_ATTRIBUTES]
+        arrays.extend(getattr(self, "_properties", {}).values())
+        layout = getattr(self, "_vertex_layout", None)
+        if not isinstance(layout, np.ndarray) and layout is not None:
+            # compact layout (see `QuantizedLayout`)
+            arrays.extend((layout.data, layout.origins))
+        if self._data is not None:
+            arrays.extend(self._data)
+        if self._grid_hash is not None:
+            arrays.extend((self._grid_hash.keys, self._grid_hash.order, self._grid_hash.sorted_keys))
+        # views (e.g. into the vertex layout) are only counted once via their base
+        seen, total = set(), 0
+        for x in arrays:
+            if not isinstance(x, np.ndarray):
+                continue
+            base = x
+            while isinstance(base.base, np.ndarray):
+                base = base.base
+            if id(base) not in seen:
+                seen.add(id(base))
+                total += base.nbytes
+        return total
+
+    def __repr__(self):
+        n = len(self) if hasattr(self, "_coords") else 0
+        return f"{type(self).__name__}(n={n}, layers={self.n_layers})"
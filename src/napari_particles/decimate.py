@@ -0,0 +1,292 @@
+"""
+Spatial decimation of particles (e.g. for previews and thumbnails)
+
+Unlike strided subsampling, which thins out sparse structures as much as dense clusters,
+particles are merged per grid cell (voxel-grid) or per blue noise sample (Poisson-disk).
+The values of merged particles are summed (preserving the total brightness) and their size
+grows with the spatial spread of the merged particles.
+
+"""
+
+import itertools
+from typing import Optional, Sequence, Tuple, Union
+import numpy as np
+from .spatial import GridHash
+
+
+def _aggregate(
+    coords: np.ndarray,
+    values: np.ndarray,
+    size: np.ndarray,
+    labels: np.ndarray,
+    n: int,
+    centers: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """merges all particles with the same label (0,...,n-1) into one particle"""
+    if n == 0:
+        return np.zeros((0, coords.shape[1])), np.zeros(0), np.zeros(0)
+    weights = np.abs(values).astype(np.float64)
+    wsum = np.bincount(labels, weights, minlength=n)
+    # fall back to uniform weights for groups without any (non zero) value
+    empty = wsum[labels] == 0
+    weights[empty] = 1
+    wsum = np.bincount(labels, weights, minlength=n)
+
+    if centers is None:
+        centers = np.stack([np.bincount(labels, weights * x, minlength=n) for x in coords.T], axis=-1)
+        centers /= wsum[:, None]
+
+    # spatial variance within the (2d) quad axes
+    spread = sum(
+        np.bincount(labels, weights * (x - c[labels]) ** 2, minlength=n)
+        for x, c in zip(coords[:, -2:].T, centers[:, -2:].T)
+    )
+    spread /= 2 * wsum
+    size = np.sqrt(np.bincount(labels, weights * size.astype(np.float64) ** 2, minlength=n) / wsum + 4 * spread)
+    values = np.bincount(labels, values, minlength=n)
+    return centers, values, size
+
+
+def _prepare(coords, values, size):
+    coords = np.asarray(coords)
+    if not coords.ndim == 2:
+        raise ValueError(f"coords should be of shape (N,D)")
+    values = np.broadcast_to(np.asarray(values, dtype=np.float64), len(coords))
+    size = np.broadcast_to(np.asarray(size, dtype=np.float64), len(coords))
+    return coords, values, size
+
+
+def voxel_downsample(
+    coords: np.ndarray,
+    voxel_size: Union[float, Sequence[float]],
+    values: Union[float, np.ndarray] = 1,
+    size: Union[float, np.ndarray] = 1,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Merges all particles within the same voxel of a regular grid
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        the particle coordinates, array of shape (N, D)
+    voxel_size : Union[float, Sequence[float]]
+        the voxel size (per axis)
+    values : Union[float, np.ndarray], optional
+        the particle values, by default 1 (merged values are then the particle counts)
+    size : Union[float, np.ndarray], optional
+        the particle sizes, by default 1
+
+    Returns
+    -------
+    coords : np.ndarray
+        the (value weighted) centroids of all occupied voxels, array of shape (M, D)
+    values : np.ndarray
+        the summed values, array of shape (M,)
+    size : np.ndarray
+        the merged sizes, array of shape (M,)
+    labels : np.ndarray
+        the index of the merged particle of every input particle, array of shape (N,)
+    """
+    coords, values, size = _prepare(coords, values, size)
+    grid = GridHash(coords, voxel_size)
+    # the hash already sorts by key, so the voxel labels are the run indices of the sorted keys
+    new_run = np.ones(len(grid), dtype=bool)
+    new_run[1:] = grid.sorted_keys[1:] != grid.sorted_keys[:-1]
+    labels = np.empty(len(grid), dtype=np.int64)
+    labels[grid.order] = np.cumsum(new_run) - 1
+    n = int(np.count_nonzero(new_run))
+    return _aggregate(coords, values, size, labels, n) + (labels,)
+
+
+def _independent_set(n: int, i: np.ndarray, j: np.ndarray, priority: np.ndarray) -> np.ndarray:
+    """maximal independent set of the graph with (symmetric) edges (i, j) via Luby's algorithm"""
+    selected = np.zeros(n, dtype=bool)
+    undecided = np.ones(n, dtype=bool)
+    while True:
+        m = undecided[i] & undecided[j]
+        i, j = i[m], j[m]
+        # nodes whose priority is larger than that of all undecided neighbours are selected
+        neighbour_max = np.full(n, -np.inf)
+        np.maximum.at(neighbour_max, i, priority[j])
+        new = undecided & (priority > neighbour_max)
+        if not np.any(new):
+            break
+        selected |= new
+        undecided &= ~new
+        undecided[j[new[i]]] = False
+    return selected
+
+
+def poisson_disk_downsample(
+    coords: np.ndarray,
+    radius: float,
+    values: Union[float, np.ndarray] = 1,
+    size: Union[float, np.ndarray] = 1,
+    seed: Optional[int] = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Selects a (maximal) subset of particles with a minimal distance of `radius` and merges every other particle into a selected one
+
+    Particles are first reduced to one per cell of size radius/sqrt(D) (such that the conflict
+    graph has bounded degree), conflicts are then resolved with a randomized (parallel)
+    maximal independent set.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        the particle coordinates, array of shape (N, D)
+    radius : float
+        the minimal distance between selected particles
+    values : Union[float, np.ndarray], optional
+        the particle values, by default 1 (merged values are then the particle counts)
+    size : Union[float, np.ndarray], optional
+        the particle sizes, by default 1
+    seed : int, optional
+        the random seed, by default 0
+
+    Returns
+    -------
+    coords : np.ndarray
+        the coordinates of the selected particles, array of shape (M, D)
+    values : np.ndarray
+        the summed values, array of shape (M,)
+    size : np.ndarray
+        the merged sizes, array of shape (M,)
+    labels : np.ndarray
+        the index of the merged particle of every input particle, array of shape (N,)
+    """
+    coords, values, size = _prepare(coords, values, size)
+    n, ndim = coords.shape
+    rng = np.random.default_rng(seed)
+
+    # one random representative per small cell
+    grid = GridHash(coords, radius / np.sqrt(ndim))
+    shuffled = rng.permutation(n)
+    order = shuffled[np.argsort(grid.keys[shuffled], kind="stable")]
+    new_run = np.ones(n, dtype=bool)
+    new_run[1:] = grid.keys[order][1:] != grid.keys[order][:-1]
+    cell_labels = np.empty(n, dtype=np.int64)
+    cell_labels[order] = np.cumsum(new_run) - 1
+    reps = order[new_run]
+
+    # conflicts between representatives closer than radius
+    rep_coords = coords[reps]
+    rep_grid = GridHash(rep_coords, radius)
+    pairs_i, pairs_j = [], []
+    for i, j in rep_grid.query_pairs():
+        m = (i != j) & (np.sum((rep_coords[i] - rep_coords[j]) ** 2, axis=-1) < radius ** 2)
+        pairs_i.append(i[m])
+        pairs_j.append(j[m])
+    pairs_i = np.concatenate(pairs_i) if len(pairs_i) > 0 else np.zeros(0, np.int64)
+    pairs_j = np.concatenate(pairs_j) if len(pairs_j) > 0 else np.zeros(0, np.int64)
+
+    selected = _independent_set(len(reps), pairs_i, pairs_j, rng.random(len(reps)))
+
+    # every rejected representative is merged into a selected one within radius
+    rep_labels = np.full(len(reps), -1, dtype=np.int64)
+    rep_labels[selected] = np.arange(np.count_nonzero(selected))
+    m = selected[pairs_j] & ~selected[pairs_i]
+    rep_labels[pairs_i[m]] = rep_labels[pairs_j[m]]
+
+    labels = rep_labels[cell_labels]
+    n_out = int(np.count_nonzero(selected))
+    return _aggregate(coords, values, size, labels, n_out, centers=rep_coords[selected]) + (labels,)
+
+
+def stratified_subsample(
+    coords: np.ndarray,
+    n: int,
+    cell_size: Optional[Union[float, Sequence[float]]] = None,
+    seed: Optional[int] = 0,
+) -> np.ndarray:
+    """Selects n of the particles such that every region keeps its share of particles
+
+    Particles are ordered by grid cell and every (N/n)-th one is taken (systematic sampling
+    with a random offset), such that sparse regions are thinned out as much as dense ones
+    but never dropped completely by chance.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        the particle coordinates, array of shape (N, D)
+    n : int
+        the number of selected particles
+    cell_size : Union[float, Sequence[float]], optional
+        the size of the strata, by default about one selected particle per cell of the bounding box
+    seed : int, optional
+        the random seed, by default 0
+
+    Returns
+    -------
+    index : np.ndarray
+        the (sorted) indices of the selected particles, array of shape (n,)
+    """
+    coords = np.asarray(coords)
+    total = len(coords)
+    if n >= total:
+        return np.arange(total)
+    if cell_size is None:
+        extent = np.ptp(coords, axis=0)
+        extent = extent[extent > 0]
+        cell_size = (np.prod(extent) / max(1, n)) ** (1 / len(extent)) if len(extent) > 0 else 1
+    grid = GridHash(coords, cell_size)
+    rng = np.random.default_rng(seed)
+    # random order within cells, such that the selection does not depend on the input order
+    shuffled = rng.permutation(total)
+    order = shuffled[np.argsort(grid.keys[shuffled], kind="stable")]
+    step = total / n
+    index = order[(rng.random() * step + step * np.arange(n)).astype(np.int64)]
+    return np.sort(index)
+
+
+def preview_layer(
+    coords: np.ndarray,
+    max_particles: int = 10**5,
+    values: Union[float, np.ndarray] = 1,
+    size: Union[float, np.ndarray] = 10,
+    method: str = "voxel",
+    **kwargs,
+):
+    """Creates a decimated `Particles` layer with at most `max_particles` particles
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        the particle coordinates, array of shape (N, 3) or (N, 2)
+    max_particles : int, optional
+        the particle budget, by default 10**5
+    values : Union[float, np.ndarray], optional
+        the particle values, by default 1
+    size : Union[float, np.ndarray], optional
+        the particle sizes, by default 10
+    method : str, optional
+        either "voxel" (voxel_downsample) or "poisson" (poisson_disk_downsample), by default "voxel"
+    **kwargs :
+        passed to `Particles`
+    """
+    from .particles import Particles
+
+    downsample = dict(voxel=voxel_downsample, poisson=poisson_disk_downsample).get(method)
+    if downsample is None:
+        raise ValueError(f"method should be 'voxel' or 'poisson', not '{method}'")
+
+    coords, values, size = _prepare(coords, values, size)
+    n, ndim = coords.shape
+    if n > max_particles:
+        extent = np.ptp(coords, axis=0)
+        extent = extent[extent > 0]
+        d = max(1, len(extent))
+        # initial guess: the budget spread evenly over the bounding box
+        scale = (np.prod(extent) / max_particles) ** (1 / d) if len(extent) > 0 else 1
+        best = None
+        for it in itertools.count():
+            result = downsample(coords, scale, values=values, size=size)
+            m = len(result[0])
+            if m <= max_particles and (best is None or m > len(best[0])):
+                best = result
+            if best is not None and (len(best[0]) >= max_particles // 2 or it >= 8):
+                break
+            # the number of occupied cells scales roughly with the (-d)-th power of the cell size
+            factor = (m / max_particles) ** (1 / d)
+            scale *= max(1.05, factor) if m > max_particles else max(0.5, factor)
+        coords, values, size, _ = best
+
+    return Particles(coords, values=values, size=size, **kwargs)
@@ -161,6 +161,8 @@ _shader_functions = {
 class ShaderFilter(Filter):
     def __init__(self, mode="gaussian", distance_intensity_increase=1, **kwargs):
         kwargs.setdefault("fhook", "post")
+        self.mode = mode
+        self.distance_intensity_increase = distance_intensity_increase
 
         fcode = Function(
             """
@@ -3,21 +3,76 @@ A billboarded particle layer with texture/shader support
 
 """
 
-from typing import Optional, Union
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Union
 import numpy as np
 from abc import ABC
 from collections.abc import Iterable
 from napari.layers import Surface
 from napari.layers.utils.layer_utils import calc_data_range
+from napari.utils.colormaps import Colormap, ensure_colormap
 import warnings
-from .utils import generate_billboards_2d
-from .billboards_filter import BillboardsFilter
+from .utils import generate_billboards_2d, pack_rgba8, repeat_rows, rgba8_to_vec2
+from .billboards_filter import BillboardsFilter, KEYFRAME_DTYPE, VERTEX_DTYPE, vertex_field, vertex_layout
+from vispy.gloo import VertexBuffer
 from .filters import ShaderFilter, _shader_functions
 from .utils import rotvec_to_quatvec
+from .stats import QuantileSketch
+from .spatial import GridHash, morton_order, neighbour_counts
+from .system import ParticleSystem
+from .dataset import ParticleDataset, shared_attributes
+from .decimate import stratified_subsample
+from .quantize import COMPACT_DTYPE, QuantizedLayout
 
+# approximate bytes per particle (4 mesh vertices, 2 faces and 6 drawn vertices), see `memory_usage`
+_HOST_BYTES_PER_PARTICLE = (
+    # coords (float64), size, sigmas, scale
+    24 + 4 + 12 + 4
+    # per mesh vertex: rotations, vertex layout, surface vertices (float64), values, texcoords
+    + 4 * (12 + VERTEX_DTYPE.itemsize + 24 + 8 + 8)
+    # surface faces
+    + 2 * 24
+    # napari views: displayed vertices, drawn particles, gathered vertex data
+    + 4 * 24 + 6 * 8 + 6 * VERTEX_DTYPE.itemsize
+    # vispy mesh data (float32 vertices, values and their copies per drawn vertex)
+    + 4 * (12 + 8) + 6 * (12 + 8)
+)
+# with quantized storage: rotations and the compact layout once per particle (instead of per mesh vertex)
+_HOST_BYTES_PER_PARTICLE_QUANTIZED = _HOST_BYTES_PER_PARTICLE - 4 * (12 + VERTEX_DTYPE.itemsize) + 12 + COMPACT_DTYPE.itemsize
+# vertex data, positions and colors per drawn vertex
+_GPU_BYTES_PER_PARTICLE = 6 * (VERTEX_DTYPE.itemsize + 12 + 4)
+
+
+def _view_dims(layer) -> tuple:
+    """(displayed, not displayed) dims of a layer
+
+    napari >= 0.4.18 keeps them in the (private) `_slice_input`, slab slicing is only
+    supported for napari < 0.4.18 (see setup.cfg), as it also overrides the layer slicing
+    """
+    slice_input = getattr(layer, "_slice_input", None)
+    if slice_input is not None:
+        return tuple(slice_input.displayed), tuple(slice_input.not_displayed)
+    return tuple(layer._dims_displayed), tuple(layer._dims_not_displayed)
+
+
+def _exhaust(gen):
+    """runs a generator to completion and returns its return value"""
+    while True:
+        try:
+            next(gen)
+        except StopIteration as e:
+            return e.value
+
+
+@shared_attributes
 class Particles(Surface):
     """Billboarded particle layer that renders camera facing quads of given size
     Can be combined with other (e.g. texture) filter to create particle systems etc
+
+    All particle buffers are held by the layer's `dataset`, which can be shared with
+    further layers (see `from_dataset`).
     """
 
     def __init__(
@@ -27,9 +82,17 @@ class Particles(Surface):
         sigmas: Union[float, tuple, np.ndarray] = (1, 1, 1),
         rotvec: Union[tuple, np.ndarray] = (1,0,0),
         values: Union[float, np.ndarray] = 1,
-        filter: ShaderFilter = ShaderFilter("gaussian"),
-        
+        colors: Optional[Union[str, np.ndarray]] = None,
+        filter: Union[str, ShaderFilter] = "gaussian",
+        properties: Optional[dict] = None,
         antialias: bool = False,
+        workers: Optional[int] = 1,
+        slab_thickness: Optional[float] = None,
+        slab_projection: str = "sum",
+        max_bytes: Optional[int] = None,
+        max_particles: Optional[int] = None,
+        quantize: Optional[float] = None,
+        reorder: Optional[str] = None,
         **kwargs,
     ):
         """Creates a particle layer from coordinates
@@ -46,14 +109,348 @@ class Particles(Surface):
             3 dimensional rotation axis, its norm is the amount of rotation
         values : Union[float, np.ndarray], optional
             values for each particle (used for determining the color), by default 1
-        filter : ShaderFilter, optional
-            the shader to be used, by default ShaderFilter("gaussian")
+        colors : Union[str, np.ndarray], optional
+            own RGBA color of each particle instead of the colormapped values (e.g. for categorical 
+            colorings), a single color or array of shape (N, 3) or (N, 4) with floats in [0, 1] or uint8.
+            Stored as packed uint8 (4 bytes per particle), by default None
+        filter : Union[str, ShaderFilter], optional
+            the shader to be used (a name is passed to ShaderFilter), by default "gaussian"
+        properties : dict, optional
+            additional per-particle attributes (e.g. photon count, frame) of length N 
+            that can be used in `filter_by`, by default None
         antialias : bool, optional
             by default False
+        workers : int, optional
+            number of threads used to build the particle geometry (None for all cores), by default 1
+        slab_thickness : float, optional
+            if given, 2D views of 3D particles show all particles within a z-slab of this thickness 
+            around the current slice (using a z-sorted index), by default None (only particles in the current slice)
+        slab_projection : str, optional
+            how particles within a slab are combined, either "sum" or "max", by default "sum"
+        max_bytes : int, optional
+            memory budget (host and GPU, see `estimate_memory_usage`). Larger inputs are subsampled 
+            (stratified, preserving the total brightness), by default None
+        max_particles : int, optional
+            particle budget (subsampled like for `max_bytes`), by default None
+        quantize : float, optional
+            if given, centers, sigmas and rotations are stored compactly (int16 offsets per tile, float16 
+            and normalized int16, see `QuantizedLayout`) with at most this positional error (in data units). 
+            The actual error is reported by `quantization_error`, by default None (float32 storage)
+        reorder : str, optional
+            "morton" stores the particles sorted along a Z-curve (spatially close particles are close in memory, 
+            which speeds up range queries and partial uploads). All per particle arrays of the layer (values, size, 
+            mask, colors, attributes, ...) keep the order of the input rows (see `order`), by default None
+        """
+        init = _exhaust(
+            self._build(
+                coords, size, sigmas, rotvec, values, colors, filter, properties, antialias, 
+                workers, slab_thickness, slab_projection, max_bytes, max_particles, quantize, reorder, **kwargs,
+            )
+        )
+        init()
+
+    # number of progress updates yielded by _build
+    _BUILD_STEPS = 6
+
+    def _build(
+        self, coords, size, sigmas, rotvec, values, colors, filter, properties, antialias, 
+        workers, slab_thickness, slab_projection, max_bytes=None, max_particles=None, quantize=None, reorder=None, 
+        **kwargs,
+    ):
+        """prepares all particle buffers, yields progress (fraction, stage) and returns a function that initializes the layer"""
+        kwargs.setdefault("shading", "none")
+        kwargs.setdefault("blending", "additive")
+
+        if max_bytes is not None or max_particles is not None:
+            coords, size, sigmas, rotvec, values, colors, properties = _subsample_to_budget(
+                coords, size, sigmas, rotvec, values, colors, properties, max_bytes, max_particles, quantize
+            )
+        if colors is not None:
+            colors = pack_rgba8(colors, len(coords))
+
+        self._init_settings(workers, quantize, reorder, slab_thickness, slab_projection)
+        data = yield from self._iter_prepare_particles(coords, size, sigmas, rotvec, values, properties)
+        if colors is not None:
+            colors = self._to_internal(colors, 2)
+        if "contrast_limits" not in kwargs:
+            # the per particle values (not the 4x repeated vertex values)
+            self._stats["values"] = QuantileSketch(data[2][::4])
+        yield 1.0, "initializing layer"
+        return functools.partial(self._init_layer, data, filter, antialias, colors=colors, **kwargs)
+
+    @staticmethod
+    def estimate_memory_usage(n: int, quantize: bool = False) -> dict:
+        """Approximate bytes needed for n particles (on the host and on the GPU, when shown)
+
+        With `quantize`, the host bytes of the compact storage (see `Particles`) are estimated.
+
+        Example
+        -------
+        >>> Particles.estimate_memory_usage(10**7)
+        {'host': 11240000000, 'gpu': 3840000000}
+        """
+        host = _HOST_BYTES_PER_PARTICLE_QUANTIZED if quantize else _HOST_BYTES_PER_PARTICLE
+        return dict(host=int(n) * host, gpu=int(n) * _GPU_BYTES_PER_PARTICLE)
+
+    def memory_usage(self) -> dict:
+        """Bytes of all buffers of the layer on the host and on the GPU (per buffer)
+
+        The dataset buffers are shared with all other layers of the `dataset`, arrays
+        referenced by several buffers are only counted once.
+
+        Example
+        -------
+        >>> usage = layer.memory_usage()
+        >>> print(sum(usage["host"].values()) / 2**20, "MB")
+        """
+        host, counted = {}, set()
+
+        def _add(name, x):
+            if isinstance(x, np.ndarray) and id(x) not in counted:
+                counted.add(id(x))
+                host[name] = host.get(name, 0) + x.nbytes
+
+        # dataset (shared)
+        for name in ("coords", "size", "sigmas", "rotvec", "scale", "vertex_layout"):
+            _add(name, getattr(self, f"_{name}"))
+        if isinstance(self._vertex_layout, QuantizedLayout):
+            _add("vertex_layout", self._vertex_layout.data)
+            _add("tile_origins", self._vertex_layout.origins)
+        _add("texcoords", self._mytexcoords)
+        for k, x in self._properties.items():
+            _add(f"property_{k}", x)
+        for name, x in zip(("vertices", "faces", "values"), self._dataset._data):
+            _add(name, x)
+        if self._grid_hash is not None:
+            for x in (self._grid_hash.keys, self._grid_hash.order, self._grid_hash.sorted_keys):
+                _add("grid_hash", x)
+        _add("order", self._order)
+        _add("z_order", self._z_order)
+        _add("z_order", getattr(self, "_z_sorted", None))
+
+        # layer
+        _add("values", self._vertex_values)
+        _add("colors", self._colors)
+        _add("mask", self._mask)
+        _add("view_vertices", getattr(self, "_data_view", None))
+        _add("view_faces", getattr(self, "_slice_faces", None))
+        _add("view_faces", self._view_faces)
+        _add("view_particles", getattr(self, "_view_particles", None))
+        _add("view_values", np.asarray(self._view_vertex_values))
+        _add("vertex_data", self._billboard_filter._vertex_data)
+
+        gpu = {}
+        if self._viewer is not None:
+            for x in vars(self._visual.mesh_data).values():
+                _add("mesh_data", x)
+            f = self._billboard_filter
+            gpu["vertex_data"] = f._vertex_buffer.nbytes
+            gpu["keyframes"] = sum(b.nbytes for b in f._keyframe_buffers)
+            if f.colors:
+                gpu["colors"] = f._color_buffer.nbytes
+            gpu["positions"] = self._visual._vertices.nbytes
+            try:
+                base_color = self._visual.shared_program.vert["base_color"]
+            except KeyError:
+                base_color = None
+            if isinstance(base_color, VertexBuffer):
+                gpu["values"] = base_color.nbytes
+        return dict(host=host, gpu=gpu)
+
+    @classmethod
+    def build_async(cls, coords: np.ndarray, viewer=None, **kwargs):
+        """Prepares all particle buffers in a background thread and creates the layer in the main thread when done
+
+        Parameters
+        ----------
+        coords : np.ndarray
+            the coordinates of the center of the particles (see `Particles`)
+        viewer : napari.Viewer, optional
+            if given, the finished layer is added to it (via `add_to_viewer`)
+        **kwargs :
+            passed to `Particles`
+
+        Returns
+        -------
+        worker : napari.qt.threading.GeneratorWorker
+            the started worker. It yields the progress as tuples (fraction, stage), `worker.returned`
+            emits the finished layer and `worker.quit()` cancels the construction (at the next stage)
+
+        Example
+        -------
+        >>> worker = Particles.build_async(coords, viewer=v, size=2)
+        >>> worker.yielded.connect(lambda p: print(f"{100 * p[0]:.0f}% {p[1]}"))
+        """
+        from napari.qt.threading import create_worker
+
+        if cls is not Particles:
+            raise NotImplementedError(f"asynchronous construction of {cls.__name__} layers is not supported")
+
+        bound = inspect.signature(cls.__init__).bind(None, coords, **kwargs)
+        bound.apply_defaults()
+        args = dict(bound.arguments)
+        args.pop("self")
+        args.update(args.pop("kwargs"))
+
+        layer = cls.__new__(cls)
+        pending = {}
+
+        def _work():
+            pending["init"] = yield from layer._build(**args)
+            return layer
+
+        def _done(layer):
+            # runs in the main thread before any other connected callback
+            pending.pop("init")()
+            if viewer is not None:
+                layer.add_to_viewer(viewer)
+
+        worker = create_worker(
+            _work, _start_thread=False, _progress=dict(total=cls._BUILD_STEPS, desc="building particles")
+        )
+        worker.returned.connect(_done)
+        worker.start()
+        return worker
+
+    @classmethod
+    def from_dataset(
+        cls,
+        dataset: ParticleDataset,
+        values: Optional[Union[float, np.ndarray]] = None,
+        colors: Optional[Union[str, np.ndarray]] = None,
+        filter: Union[str, ShaderFilter] = "gaussian",
+        antialias: bool = False,
+        workers: Optional[int] = 1,
+        slab_thickness: Optional[float] = None,
+        slab_projection: str = "sum",
+        **kwargs,
+    ):
+        """Creates a layer that shows the particles of an existing dataset without copying them
+
+        Shading, mask, colormap and contrast limits are per layer, changes of the shared
+        attributes (coords, size, sigmas) are shown in all layers of the dataset.
+
+        Parameters
+        ----------
+        dataset : ParticleDataset
+            the dataset of another layer (`layer.dataset`)
+        values : Union[float, np.ndarray], optional
+            own values of this layer, by default None (the values the dataset was created with)
+        colors : Union[str, np.ndarray], optional
+            own colors of this layer (see `Particles`), by default None
+        **kwargs :
+            see `Particles`
+
+        Example
+        -------
+        >>> layer2 = Particles.from_dataset(layer.dataset, filter="sphere", colormap="magma")
         """
+        if cls is not Particles:
+            raise NotImplementedError(f"shared datasets of {cls.__name__} layers are not supported")
         kwargs.setdefault("shading", "none")
         kwargs.setdefault("blending", "additive")
 
+        layer = cls.__new__(cls)
+        # new particles of this layer (see `set_particles`) are reordered like the dataset
+        reorder = None if dataset._order is None else "morton"
+        layer._init_settings(workers, None, reorder, slab_thickness, slab_projection)
+        layer._dataset = dataset
+        dataset._attach(layer)
+        layer._mask = None
+        layer._stats = {}
+        vertices, faces, vertex_values = dataset._data
+        if values is not None:
+            values = layer._to_internal(np.broadcast_to(values, len(dataset)))
+            vertex_values = repeat_rows(values, 4, workers=workers)
+        if colors is not None:
+            colors = layer._to_internal(pack_rgba8(colors, len(dataset)), 2)
+        layer._init_layer((vertices, faces, vertex_values), filter, antialias, colors=colors, **kwargs)
+        return layer
+
+    def _init_settings(self, workers=1, quantize=None, reorder=None, slab_thickness=None, slab_projection="sum"):
+        """sets the construction settings of the layer (for every way a layer is created, see also `_new_dataset`)"""
+        self._workers = workers
+        self._quantize = quantize
+        self._reorder = reorder
+        self._slab_thickness = slab_thickness
+        self._slab_projection = slab_projection
+
+    def _new_dataset(self, order: Optional[np.ndarray] = None):
+        """attaches the layer to a new dataset and resets all derived per particle state"""
+        # other layers keep showing the old dataset
+        if getattr(self, "_dataset", None) is not None:
+            self._dataset._detach(self)
+        self._dataset = ParticleDataset()
+        self._dataset._attach(self)
+        self._order = order
+        self._mask = None
+        self._system = None
+        # z-sorted index for slab slicing (created on demand)
+        self._z_order = None
+        # cached statistics (see `statistics`) and extent
+        self._stats = {}
+        self._extent = None
+
+    @property
+    def dataset(self) -> ParticleDataset:
+        """The (shareable) particle buffers of this layer"""
+        return self._dataset
+
+    @property
+    def order(self) -> Optional[np.ndarray]:
+        """The input row of every particle in the (reordered) buffers, None if not reordered (see `reorder`)"""
+        return self._order
+
+    def _to_internal(self, x, ndim: int = 1):
+        """a per particle array (in the order of the input rows) in the order of the buffers"""
+        order = self._order
+        if order is None or x is None:
+            return x
+        x = np.asarray(x)
+        # broadcastable values (e.g. a single size or sigma) are kept
+        return x[order] if x.ndim >= ndim and len(x) == len(order) else x
+
+    def _to_input(self, x):
+        """a per particle array of the buffers in the order of the input rows (inverse of `_to_internal`)"""
+        order = self._order
+        if order is None or x is None:
+            return x
+        out = np.empty_like(x)
+        out[order] = x
+        return out
+
+    @property
+    def quantization_error(self) -> float:
+        """The maximal positional error of the drawn particles (0 for float32 storage, see `quantize`)"""
+        layout = self._vertex_layout
+        return layout.max_error if isinstance(layout, QuantizedLayout) else 0.0
+
+    def _init_layer(self, data, filter, antialias, colors=None, **kwargs):
+        """creates the filters and initializes the underlying surface layer"""
+        self._antialias = antialias
+        # per layer colors (like values and colormap), packed uint8 RGBA
+        self._colors = None if colors is None else pack_rgba8(colors, len(data[0]) // 4)
+        self._billboard_filter = BillboardsFilter(antialias=antialias)
+        self.filter = filter
+        self._viewer = None
+        # keyframe playback (see `set_keyframes`)
+        self._keyframes = None
+        self._keyframe_executor = None
+        if "contrast_limits" not in kwargs:
+            if "values" not in self._stats:
+                # the per particle values (not the 4x repeated vertex values)
+                self._stats["values"] = QuantileSketch(data[2][::4])
+            kwargs["contrast_limits"] = self._calc_data_range()
+        super().__init__(data, **kwargs)
+
+    def _prepare_particles(self, coords, size, sigmas, rotvec, values, properties):
+        """sets all particle arrays and returns the surface data (vertices, faces, values)"""
+        return _exhaust(self._iter_prepare_particles(coords, size, sigmas, rotvec, values, properties))
+
+    def _iter_prepare_particles(self, coords, size, sigmas, rotvec, values, properties):
+        """same as `_prepare_particles`, but yields the progress (fraction, stage) between stages"""
+        yield 0.0, "checking inputs"
+        workers = self._workers
         coords = np.asarray(coords)
         sigmas = np.asarray(sigmas, dtype=np.float32)
         rotvec = np.asarray(rotvec, dtype=np.float32)
@@ -74,46 +471,673 @@ class Particles(Surface):
         if not len(size) == len(coords) == len(sigmas):
             raise ValueError()
 
+        properties = {} if properties is None else dict(properties)
+        for k, v in properties.items():
+            properties[k] = np.asarray(v)
+            if not len(properties[k]) == len(coords):
+                raise ValueError(f"property '{k}' should be of length {len(coords)}")
+
         # add dummy z if 2d coords
         if coords.shape[1] == 2:
             coords = np.concatenate([np.zeros((len(coords), 1)), coords], axis=-1)
 
         assert coords.shape[-1] == sigmas.shape[-1] == 3
 
-        vertices, faces, texcoords = generate_billboards_2d(coords, size=size)
+        reorder = getattr(self, "_reorder", None)
+        if reorder is None:
+            order = None
+        elif reorder == "morton":
+            order = morton_order(coords, workers=workers)
+            order = order.astype(np.int32) if len(order) < 2**31 else order
+            coords, size, sigmas, rotvec, values = (x[order] for x in (coords, size, sigmas, rotvec, values))
+            properties = {k: v[order] for k, v in properties.items()}
+        else:
+            raise ValueError(f"reorder should be None or 'morton', not '{reorder}'")
+
+        yield 0.05, "generating billboards"
+        # unit quads, the size is applied per particle in the vertex shader
+        vertices, faces, texcoords = generate_billboards_2d(coords, size=1, workers=workers)
 
-        
-        # repeat values for each 4 vertices
-        centercoords = np.repeat(coords, 4, axis=0)
-        sigmas = np.repeat(sigmas, 4, axis=0)
-        rotvec = np.repeat(rotvec, 4, axis=0)
-        values = np.repeat(values, 4, axis=0)
+        yield 0.35, "laying out vertices"
+        # new particles always get a new dataset
+        self._new_dataset(order)
         self._coords = coords
-        self._centercoords = centercoords
-        self._sigmas = sigmas
-        self.rotvec = rotvec
-        # self._orient = orient
-        self._size = size
+        self._sigmas = np.array(sigmas, dtype=np.float32)
+        self._size = np.array(size, dtype=np.float32)
         self._mytexcoords = texcoords
-        self._billboard_filter = BillboardsFilter(antialias=antialias)
-        self.filter = filter
-        self._viewer = None
-        super().__init__((vertices, faces, values), **kwargs)
+        # per particle scale of the unit quads (0 for hidden particles)
+        self._scale = np.empty(len(coords), dtype=np.float32)
+        quantize = getattr(self, "_quantize", None)
+        if quantize is None:
+            # interleaved per vertex attributes, the drawn vertices are gathered from
+            self._vertex_layout = vertex_layout(4 * len(coords))
+            self._centercoords = vertex_field(self._vertex_layout, "centercoords")
+            self._quatvec = vertex_field(self._vertex_layout, "quatvec")
+            vertex_field(self._vertex_layout, "texcoords")[:] = texcoords
+
+            # repeat values for each 4 vertices
+            repeat_rows(coords, 4, workers=workers, out=self._centercoords)
+            rotvec = repeat_rows(rotvec, 4, workers=workers)
+            repeat_rows(self._sigmas, 4, workers=workers, out=vertex_field(self._vertex_layout, "sigmas"))
+            yield 0.55, "computing rotations"
+            self.rotvec = rotvec
+        else:
+            # compact per particle storage, dequantized when the drawn vertices are gathered
+            self._centercoords = self._quatvec = None
+            yield 0.55, "computing rotations"
+            self._rotvec = rotvec
+            quatvec = rotvec_to_quatvec(rotvec, workers=workers)
+            self._vertex_layout = QuantizedLayout(coords, self._sigmas, quatvec, self._scale, max_error=quantize)
+        # self._orient = orient
+        yield 0.85, "repeating values"
+        values = repeat_rows(values, 4, workers=workers)
+        self._properties = properties
+        self._update_scale()
+        self._dataset._data = (vertices, faces, values)
+        return vertices, faces, values
+
+    def set_particles(
+        self,
+        coords: np.ndarray,
+        size: Union[float, np.ndarray] = 10,
+        sigmas: Union[float, tuple, np.ndarray] = (1, 1, 1),
+        rotvec: Union[tuple, np.ndarray] = (1,0,0),
+        values: Union[float, np.ndarray] = 1,
+        properties: Optional[dict] = None,
+        colors: Optional[Union[str, np.ndarray]] = None,
+    ):
+        """Replaces all particles of the layer (see `Particles` for the parameters)"""
+        if hasattr(self, "_tmp_rotvec0"):
+            del self._tmp_rotvec0
+        data = self._prepare_particles(coords, size, sigmas, rotvec, values, properties)
+        self._colors = None if colors is None else self._to_internal(pack_rgba8(colors, len(self._coords)), 2)
+        self.data = data
+
+    def save_snapshot(self, path: str):
+        """Saves all prepared buffers of the layer as memory-mappable snapshot (see `Particles.load_snapshot`)"""
+        from .snapshot import save_snapshot
+
+        save_snapshot(self, path)
+
+    @classmethod
+    def load_snapshot(cls, path: str, mmap: bool = True, **kwargs):
+        """Loads a layer saved with `save_snapshot` without redoing any of the construction
+
+        Parameters
+        ----------
+        path : str
+            the snapshot folder
+        mmap : bool, optional
+            memory-map the buffers (copy-on-write) instead of reading them, by default True
+        **kwargs : 
+            overrides the saved layer parameters (e.g. name, colormap, filter)
+        """
+        from .snapshot import load_snapshot
+
+        return load_snapshot(path, mmap=mmap, cls=cls, **kwargs)
 
     def _set_view_slice(self):
         """Sets the view given the indices to slice with."""
-        super()._set_view_slice()
-        self._update_billboard_filter()
+        if self._use_slab_index():
+            self._set_view_slab()
+        else:
+            super()._set_view_slice()
+        self._slice_faces = self._view_faces
+        self._apply_mask()
+        self._schedule_billboard_update()
 
-    def _update_billboard_filter(self):
-        faces = self._view_faces.flatten()
-        
-        if self._billboard_filter._attached and len(faces) > 0:
-            self._billboard_filter.texcoords = self._mytexcoords[faces]
-            self._billboard_filter.centercoords = self._centercoords[faces][:, -3:]
-            self._billboard_filter.sigmas = self._sigmas[faces][:, -3:]
-            self._billboard_filter.quatvec = self._quatvec[faces][:, -3:]
+    def _schedule_billboard_update(self):
+        """coalesces view changes (e.g. while scrubbing a dims slider) into at most one upload per drawn frame"""
+        if self._viewer is None or not self._billboard_filter._attached:
+            self._update_billboard_filter()
+            return
+        self._billboard_update_pending = True
+        self._visual.update()
+
+    def _flush_billboard_update(self, event=None):
+        # connected to the canvas draw event, i.e. runs once before every frame
+        if getattr(self, "_billboard_update_pending", False):
+            self._billboard_update_pending = False
+            self._update_billboard_filter()
+
+    def _use_slab_index(self) -> bool:
+        """slab slicing is used when only the first (z) axis is not displayed"""
+        return (
+            self._slab_thickness is not None
+            and _view_dims(self)[1] == (0,)
+            and len(self._coords) > 0
+        )
+
+    @property
+    def _round_index(self):
+        # continuous (unrounded) slice position for slab slicing
+        return not self._use_slab_index()
+
+    def _set_view_slab(self):
+        """Sets the view to all particles within the z-slab via two binary searches"""
+        if self._z_order is None:
+            self._z_order = np.argsort(self._coords[:, 0], kind="stable")
+            self._z_sorted = self._coords[self._z_order, 0]
+
+        disp = _view_dims(self)[0]
+        src = getattr(self, "_data_view_src", None)
+        if src is None or src[0] is not self._vertices or src[1] != disp:
+            self._data_view = self._vertices[:, list(disp)]
+            self._data_view_src = (self._vertices, disp)
+        self._view_vertex_values = self.vertex_values
+
+        z = self._slice_indices[0]
+        lo = np.searchsorted(self._z_sorted, z - 0.5 * self._slab_thickness, side="left")
+        hi = np.searchsorted(self._z_sorted, z + 0.5 * self._slab_thickness, side="right")
+        prev = getattr(self, "_slab_range", None)
+        if prev is not None and prev[0] is self._z_order and prev[1:] == (lo, hi):
+            # same particles in the slab: keep the faces (and skip the upload, see `_update_billboard_filter`)
+            self._view_faces = prev[3]
+        else:
+            # every particle owns the 2 faces 2*i, 2*i+1
+            self._view_faces = self.faces.reshape((-1, 2, 3))[self._z_order[lo:hi]].reshape((-1, 3))
+            self._slab_range = (self._z_order, lo, hi, self._view_faces)
+
+        if self._keep_auto_contrast:
+            self.reset_contrast_limits()
+
+    @property
+    def slab_thickness(self) -> Optional[float]:
+        """Thickness of the z-slab shown in 2D views (None to only show the current slice)"""
+        return self._slab_thickness
+
+    @slab_thickness.setter
+    def slab_thickness(self, thickness: Optional[float]):
+        self._slab_thickness = thickness
+        self.refresh()
+
+    @property
+    def slab_projection(self) -> str:
+        """How particles within a slab are combined, either "sum" or "max" """
+        return self._slab_projection
+
+    @slab_projection.setter
+    def slab_projection(self, projection: str):
+        self._slab_projection = projection
+        self._update_slab_projection()
+
+    def _update_slab_projection(self):
+        if not self._slab_projection in ("sum", "max"):
+            raise ValueError(f"slab_projection should be 'sum' or 'max', not '{self._slab_projection}'")
+        if self._viewer is None:
+            return
+        if self._slab_projection == "max":
+            self._visual.set_gl_state(
+                depth_test=False, blend=True, blend_func=("one", "one"), blend_equation="max"
+            )
+            self._visual.update()
+        else:
+            # restores the gl state of the current blending mode
+            self.events.blending()
+
+    def _draw_mask(self):
+        """the boolean mask of drawn particles (None if all are drawn)"""
+        return self._mask
+
+    def _apply_mask(self):
+        """restricts the faces of the current slice to the unmasked particles"""
+        faces = self._slice_faces
+        mask = self._draw_mask()
+        if mask is not None and len(faces) > 0:
+            # every particle owns the 4 vertices 4*i,...,4*i+3
+            faces = faces[mask[faces[:, 0] // 4]]
+        self._view_faces = faces
+
+    def _refresh_mask(self):
+        if hasattr(self, "_slice_faces"):
+            self._apply_mask()
+            self._schedule_billboard_update()
+            self.events.set_data()
+
+    @property
+    def mask(self):
+        """Boolean array of shape (N,) of the particles that are drawn (None if all are)"""
+        return self._to_input(self._mask)
+
+    @mask.setter
+    def mask(self, mask):
+        self.set_mask(mask)
+
+    def set_mask(self, mask: Optional[np.ndarray] = None):
+        """Sets which particles are drawn without rebuilding the layer
+
+        Only the faces of the current slice are re-indexed, all other 
+        (per-vertex) arrays stay untouched.
+
+        Parameters
+        ----------
+        mask : np.ndarray, optional
+            boolean array of shape (N,), if None all particles are drawn
+        """
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+            if not mask.shape == (len(self._coords),):
+                raise ValueError(f"mask should be of shape ({len(self._coords)},)")
+            mask = self._to_internal(mask)
+        self._mask = mask
+        self._refresh_mask()
+
+    def filter_by(self, func):
+        """Draws only the particles for which `func(attrs)` is True
+
+        Parameters
+        ----------
+        func : callable
+            gets a dict with the per-particle arrays 'coords', 'size', 'values', 'sigmas' 
+            and all additional `properties` and returns a boolean array of shape (N,)
+
+        Example
+        -------
+        >>> layer.filter_by(lambda attrs: attrs['phot'] > 1000)
+        """
+        self.set_mask(func(self.attributes))
+
+    @property
+    def attributes(self) -> dict:
+        """Dict of all per-particle arrays (of length N)"""
+        return {k: self._to_input(v) for k, v in self._attributes().items()}
+
+    def _attributes(self) -> dict:
+        """`attributes` in the order of the buffers"""
+        attrs = dict(self._properties)
+        attrs.update(
+            coords=self._coords,
+            size=self._size,
+            values=self._vertex_values[::4],
+            sigmas=self._sigmas,
+        )
+        return attrs
+
+    def statistics(self, name: str = "values", column: Optional[int] = None) -> QuantileSketch:
+        """Cached min/max and approximate quantiles of a per-particle attribute (see `attributes`)
+
+        Computed once in a single streaming pass and invalidated when the attribute changes.
+        Attributes with several columns (e.g. coords, sigmas) have one sketch per column.
+
+        Parameters
+        ----------
+        name : str, optional
+            the attribute, by default "values"
+        column : int, optional
+            the column of a multi-column attribute (required for those), by default None
+
+        Example
+        -------
+        >>> lo, hi = layer.statistics("values").percentile((1, 99))
+        >>> zmin = layer.statistics("coords", column=0).min
+        """
+        if name not in self._stats:
+            # order independent, i.e. computed from the buffers directly
+            x = np.asarray(self._attributes()[name])
+            self._stats[name] = (
+                QuantileSketch(x) if x.ndim == 1 else tuple(QuantileSketch(c) for c in x.reshape((len(x), -1)).T)
+            )
+        stats = self._stats[name]
+        if isinstance(stats, tuple):
+            if column is None:
+                raise ValueError(f"'{name}' has {len(stats)} columns, select one with column")
+            return stats[column]
+        if column not in (None, 0):
+            raise ValueError(f"'{name}' has a single column")
+        return stats
+
+    def _invalidate_statistics(self, *names: str):
+        for name in names:
+            self._stats.pop(name, None)
+
+    def set_local_density(self, radius: float, workers: Optional[int] = None) -> np.ndarray:
+        """Sets the values to the local density, i.e. the number of other particles within `radius`
+
+        The spatial hash of the coordinates is kept with the dataset and reused for other
+        radii (it is only rebuilt for radii much smaller than its cell size).
+
+        Parameters
+        ----------
+        radius : float
+            the neighbourhood radius (in data coordinates)
+        workers : int, optional
+            number of threads, by default None (the workers of the layer)
+
+        Returns
+        -------
+        density : np.ndarray
+            the neighbour counts, array of shape (N,)
+        """
+        grid = self._grid_hash
+        if grid is None or radius < 0.5 * np.max(grid.cell_size):
+            grid = self._grid_hash = GridHash(self._coords, radius)
+        workers = self._workers if workers is None else workers
+        density = self._to_input(neighbour_counts(self._coords, radius, grid=grid, workers=workers))
+        self.values = density
+        self.reset_contrast_limits()
+        return density
+
+    def _calc_data_range(self, mode="data"):
+        stats = self.statistics("values")
+        return [stats.min, stats.max] if stats.min < stats.max else [0, 1]
+
+    def _update_billboard_filter(self, force: bool = False):
+        """gathers and uploads the drawn vertices (skipped if the drawn faces did not change, unless forced)"""
+        view_faces, drawn = self._view_faces, getattr(self, "_drawn_view", None)
+        attached = self._billboard_filter._attached
+        if not force and attached and drawn is not None and drawn[1] is self._vertex_layout and (
+            view_faces is drawn[0] or (view_faces.shape == drawn[0].shape and np.array_equal(view_faces, drawn[0]))
+        ):
+            return
+        self._drawn_view = (view_faces, self._vertex_layout) if attached else None
+
+        faces = view_faces.flatten()
+        # the particle index of every drawn vertex
+        self._view_particles = faces // 4
         
+        if attached and len(faces) > 0:
+            self._billboard_filter.set_vertex_data(self._vertex_layout, faces)
+            self._upload_colors()
+        if self._keyframes is not None:
+            self._show_keyframes(reload=True)
+
+    def _update_scale(self, start: int = 0, stop: Optional[int] = None):
+        """per particle quad scale from the size (and the particle system, if any)"""
+        stop = len(self._scale) if stop is None else stop
+        sl = slice(start, stop)
+        self._scale[sl] = self._size[sl]
+        if self._system is not None:
+            self._scale[sl] *= self._system.alive[sl]
+        if isinstance(self._vertex_layout, QuantizedLayout):
+            # the compact layout references the per particle scale
+            return
+        repeat_rows(self._scale[sl], 4, out=vertex_field(self._vertex_layout, "scale")[4 * start:4 * stop])
+
+    @property
+    def values(self) -> np.ndarray:
+        """The values of the particles (used for determining the color), array of shape (N,)"""
+        return self._to_input(self._vertex_values[::4])
+
+    @values.setter
+    def values(self, values: Union[float, np.ndarray]):
+        self._invalidate_statistics("values")
+        self._set_vertex_values(np.broadcast_to(self._to_internal(values), len(self._coords)))
+
+    def _set_vertex_values(self, values: np.ndarray):
+        """sets the per particle values and only uploads the color buffer of the visual"""
+        self._vertex_values = repeat_rows(values, 4, workers=self._workers)
+        self._view_vertex_values = self._vertex_values
+        if self._viewer is None:
+            return
+        # same vertex order as the (reversed) faces of the surface visual
+        faces = self._view_faces[:, ::-1].flatten()
+        try:
+            base_color = self._visual.shared_program.vert['base_color']
+        except KeyError:
+            base_color = None
+        if isinstance(base_color, VertexBuffer) and base_color.size == len(faces):
+            base_color.set_data(self._vertex_values[faces].astype(np.float32)[:, np.newaxis])
+            # the mesh data is used whenever vispy rebuilds the colors (e.g. after clim or cmap changes)
+            self._visual.mesh_data.set_vertex_values(self._vertex_values)
+            self._visual.update()
+        else:
+            self.events.set_data()
+
+    @property
+    def colors(self) -> Optional[np.ndarray]:
+        """The RGBA colors of the particles (uint8, array of shape (N, 4)), None if the values are colormapped"""
+        return self._to_input(self._colors)
+
+    @colors.setter
+    def colors(self, colors: Optional[Union[str, np.ndarray]]):
+        self._colors = None if colors is None else self._to_internal(pack_rgba8(colors, len(self._coords)), 2)
+        self._upload_colors()
+        if self._viewer is not None:
+            self._visual.update()
+
+    def _upload_colors(self):
+        """uploads the colors of the drawn vertices (gathered from the 4 bytes per particle)"""
+        f = self._billboard_filter
+        if not f._attached:
+            return
+        if self._colors is None:
+            if f.colors:
+                f.set_colors(None)
+        else:
+            f.set_colors(rgba8_to_vec2(self._colors[self._view_particles]))
+
+    @property
+    def size(self) -> np.ndarray:
+        """The size of the particles, array of shape (N,)"""
+        return self._to_input(self._size)
+
+    @size.setter
+    def size(self, size: Union[float, np.ndarray]):
+        self._size[:] = self._to_internal(size)
+        self._extent = None
+        self._update_scale()
+        for layer in self._dataset.layers:
+            layer._invalidate_statistics("size")
+            layer._upload_view()
+
+    @property
+    def sigmas(self) -> np.ndarray:
+        """The sigmas of the particles, array of shape (N, 3)"""
+        return self._to_input(self._sigmas)
+
+    @sigmas.setter
+    def sigmas(self, sigmas: Union[float, tuple, np.ndarray]):
+        self._sigmas[:] = self._to_internal(np.asarray(sigmas, dtype=np.float32), 2)
+        if isinstance(self._vertex_layout, QuantizedLayout):
+            self._vertex_layout.set_sigmas(self._sigmas)
+        else:
+            repeat_rows(self._sigmas, 4, workers=self._workers, out=vertex_field(self._vertex_layout, "sigmas"))
+        for layer in self._dataset.layers:
+            layer._invalidate_statistics("sigmas")
+            layer._upload_view()
+
+    def _upload_view(self):
+        """Uploads the vertex data of all drawn particles (after a shared attribute changed)"""
+        if self._billboard_filter._attached:
+            self._update_billboard_filter(force=True)
+            self._visual.update()
+
+    @classmethod
+    def from_system(cls, system: ParticleSystem, size: Union[float, np.ndarray] = 10, **kwargs):
+        """Creates a layer with one particle per slot of the given particle system
+
+        Advance the system and update the layer with `layer.step(dt)`, dead particles are hidden.
+        """
+        if kwargs.get("quantize") is not None:
+            raise NotImplementedError("particle systems need float32 storage (quantize=None)")
+        if kwargs.get("reorder") is not None:
+            raise NotImplementedError("particle systems keep their slot order (reorder=None)")
+        coords = np.zeros((system.capacity, 3), dtype=np.float32)
+        coords[:, -system.ndim:] = system.positions
+        layer = cls(coords, size=size, **kwargs)
+        layer._system = system
+        layer._update_scale()
+        system.consume_dirty()
+        return layer
+
+    @property
+    def system(self) -> Optional[ParticleSystem]:
+        """The particle system driving this layer (if created with `from_system`)"""
+        return self._system
+
+    def step(self, dt: float):
+        """Advances the particle system by dt and uploads only the changed particles"""
+        if self._system is None:
+            raise ValueError("layer is not driven by a particle system, use Particles.from_system")
+        self._system.step(dt)
+        start, stop = self._system.consume_dirty()
+        if stop > start:
+            ndim = self._system.ndim
+            self._coords[start:stop, -ndim:] = self._system.positions[start:stop]
+            self._centercoords[4 * start:4 * stop] = np.repeat(self._coords[start:stop], 4, axis=0)
+            self._grid_hash = None
+            # moved particles invalidate the z-sorted slab index
+            moved_z = ndim == self._coords.shape[1]
+            if moved_z:
+                self._z_order = None
+            if self._extent is not None:
+                self._update_extent(start, stop)
+            self._update_scale(start, stop)
+            for layer in self._dataset.layers:
+                layer._invalidate_statistics("coords")
+                if moved_z and hasattr(layer, "_slice_faces") and layer._use_slab_index():
+                    layer._set_view_slice()
+                    layer.events.set_data()
+                layer._upload_range(start, stop)
+
+    def _upload_range(self, start: int, stop: int):
+        """Uploads center coordinates and scale of the particles start,...,stop-1"""
+        if not self._billboard_filter._attached:
+            return
+        drawn = getattr(self, "_drawn_view", None)
+        if self._view_faces is self.faces and drawn is not None and drawn[0] is self.faces:
+            # full (unsliced and unmasked) view: particle i owns the buffer rows 6*i,...,6*i+5
+            faces = self.faces[2 * start:2 * stop].flatten()
+            self._billboard_filter.set_vertex_data(self._vertex_layout, faces, offset=6 * start)
+        else:
+            self._update_billboard_filter(force=True)
+        self._visual.update()
+
+    def set_keyframes(
+        self,
+        keyframes: Optional[Sequence[np.ndarray]],
+        sigmas: Optional[Sequence[np.ndarray]] = None,
+        time: float = 0,
+    ):
+        """Plays back a time series of particle positions by interpolating between keyframes on the GPU
+
+        Only two keyframes are resident at a time. Changing `keyframe_time` within an interval
+        only sets the interpolation parameter (a shader uniform). When an interval ends, the
+        next keyframe becomes the current one and only the following keyframe is uploaded,
+        which has been gathered in a background thread. The layer coordinates (used for
+        slicing) are not changed.
+
+        Parameters
+        ----------
+        keyframes : Sequence[np.ndarray]
+            the coordinates of all particles per keyframe, e.g. an array of shape (T, N, D) or a
+            sequence of T arrays of shape (N, D) that are loaded on access. None stops the playback
+        sigmas : Sequence[np.ndarray], optional
+            the sigmas per keyframe (T arrays of shape (N, 3) or (3,)), by default None (the layer sigmas)
+        time : float, optional
+            the initial keyframe time, by default 0
+
+        Example
+        -------
+        >>> layer.set_keyframes(trajectories)
+        >>> layer.keyframe_time = 2.5  # halfway between the keyframes 2 and 3
+        """
+        self._keyframe_prefetch = None
+        if keyframes is None:
+            self._keyframes = None
+            self._billboard_filter.keyframes = False
+            self._shutdown_keyframe_executor()
+        else:
+            if len(keyframes) < 2:
+                raise ValueError("at least 2 keyframes are needed")
+            if sigmas is not None and len(sigmas) != len(keyframes):
+                raise ValueError(f"sigmas should be given for all {len(keyframes)} keyframes")
+            self._keyframes = keyframes
+            self._keyframe_sigmas = sigmas
+            self._keyframe_pair = None
+            self._billboard_filter.keyframes = True
+            self.keyframe_time = time
+        if self._viewer is not None:
+            self._visual.update()
+
+    @property
+    def n_keyframes(self) -> int:
+        """The number of keyframes (0 without keyframe playback)"""
+        return 0 if self._keyframes is None else len(self._keyframes)
+
+    @property
+    def keyframe_time(self) -> float:
+        """The playback time in keyframes, i.e. within [0, n_keyframes - 1]"""
+        if self._keyframes is None:
+            raise ValueError("no keyframes set, use set_keyframes")
+        return self._keyframe_time
+
+    @keyframe_time.setter
+    def keyframe_time(self, time: float):
+        if self._keyframes is None:
+            raise ValueError("no keyframes set, use set_keyframes")
+        self._keyframe_time = float(np.clip(time, 0, len(self._keyframes) - 1))
+        self._show_keyframes()
+        self._billboard_filter.keyframe_t = self._keyframe_time - self._keyframe_interval()
+        if self._viewer is not None:
+            self._visual.update()
+
+    def _keyframe_interval(self) -> int:
+        return min(int(self._keyframe_time), len(self._keyframes) - 2)
+
+    def _show_keyframes(self, reload: bool = False):
+        """makes the keyframes k and k+1 of the current interval resident (uploading only what is missing)"""
+        if not self._billboard_filter._attached:
+            # uploaded when added to a viewer
+            self._keyframe_pair = None
+            return
+        k = self._keyframe_interval()
+        f = self._billboard_filter
+        if self._keyframe_pair == k and not reload:
+            return
+        if self._keyframe_pair == k - 1 and not reload:
+            f.swap_keyframes()
+            f.set_keyframe(self._gather_keyframe(k + 1))
+        else:
+            f.set_keyframe(self._gather_keyframe(k), current=True)
+            f.set_keyframe(self._gather_keyframe(k + 1))
+        self._keyframe_pair = k
+        if k + 2 < len(self._keyframes):
+            self._prefetch_keyframe(k + 2)
+
+    def _keyframe_data(self, i: int, faces: np.ndarray) -> np.ndarray:
+        """the keyframe i of the drawn vertices `faces` (one KEYFRAME_DTYPE row per vertex)"""
+        coords = np.asarray(self._keyframes[i])
+        if coords.ndim == 2 and coords.shape[1] == 2:
+            coords = np.concatenate([np.zeros((len(coords), 1), coords.dtype), coords], axis=-1)
+        if not coords.shape == self._coords.shape:
+            raise ValueError(f"keyframe {i} should be of shape {self._coords.shape}")
+        sigmas = self._sigmas if self._keyframe_sigmas is None else self._keyframe_sigmas[i]
+        sigmas = np.broadcast_to(np.asarray(sigmas, dtype=np.float32), (len(coords), 3))
+        particles = faces // 4
+        # keyframes are given in the order of the input rows
+        rows = particles if self._order is None else self._order[particles]
+        data = np.empty(len(faces), dtype=KEYFRAME_DTYPE)
+        vertex_field(data, "centercoords")[:] = coords[rows]
+        vertex_field(data, "sigmas")[:] = sigmas[rows]
+        return data
+
+    def _gather_keyframe(self, i: int) -> np.ndarray:
+        prefetch = self._keyframe_prefetch
+        if prefetch is not None and prefetch[0] == i and prefetch[1] is self._view_faces:
+            return prefetch[2].result()
+        return self._keyframe_data(i, self._view_faces.flatten())
+
+    def _shutdown_keyframe_executor(self):
+        """stops the prefetching thread (pending prefetches are cancelled)"""
+        executor, self._keyframe_executor = self._keyframe_executor, None
+        self._keyframe_prefetch = None
+        if executor is None:
+            return
+        try:
+            executor.shutdown(wait=False, cancel_futures=True)
+        except TypeError:
+            # python < 3.9
+            executor.shutdown(wait=False)
+
+    def _prefetch_keyframe(self, i: int):
+        """gathers the keyframe i (for the current view) in a background thread"""
+        if self._keyframe_executor is None:
+            self._keyframe_executor = ThreadPoolExecutor(1)
+        faces = self._view_faces
+        future = self._keyframe_executor.submit(self._keyframe_data, i, faces.flatten())
+        self._keyframe_prefetch = (i, faces, future)
+
     @property
     def rotvec(self):        
         return self._rotvec
@@ -121,7 +1145,10 @@ class Particles(Surface):
     @rotvec.setter
     def rotvec(self, value):        
         self._rotvec = value
-        self._quatvec = rotvec_to_quatvec(self._rotvec)
+        if isinstance(self._vertex_layout, QuantizedLayout):
+            self._vertex_layout.set_quatvec(rotvec_to_quatvec(self._rotvec, workers=self._workers))
+        else:
+            rotvec_to_quatvec(self._rotvec, workers=self._workers, out=self._quatvec)
         return self._rotvec
 
 
@@ -134,6 +1161,8 @@ class Particles(Surface):
     def filter(self, value):
         if value is None:
             value = ()
+        elif isinstance(value, str):
+            value = (ShaderFilter(value),)
         elif not isinstance(value, Iterable):
             value = (value,)
         self._filter = tuple(value)
@@ -145,15 +1174,24 @@ class Particles(Surface):
         -------
         extent_data : array, shape (2, D)
         """
-        if len(self._coords) == 0:
-            extrema = np.full((2, self.ndim), np.nan)
-        else:
-            size = np.repeat(self._size[:, np.newaxis], self.ndim, axis=-1)
-            size[:, :-2] *= 0
-            maxs = np.max(self._coords + 0.5 * size, axis=0)
-            mins = np.min(self._coords - 0.5 * size, axis=0)
-            extrema = np.vstack([mins, maxs])
-        return extrema
+        if self._extent is None:
+            self._update_extent()
+        return self._extent.copy()
+
+    def _update_extent(self, start: int = 0, stop: Optional[int] = None):
+        """(incrementally) extends the cached extent by the particles start,...,stop-1"""
+        coords, half = self._coords[start:stop], 0.5 * self._size[start:stop]
+        if len(coords) == 0:
+            if self._extent is None:
+                self._extent = np.full((2, self.ndim), np.nan)
+            return
+        # the size only extends the last two (quad) axes
+        mins = np.concatenate([np.min(coords[:, :-2], axis=0), [np.min(x - half) for x in coords[:, -2:].T]])
+        maxs = np.concatenate([np.max(coords[:, :-2], axis=0), [np.max(x + half) for x in coords[:, -2:].T]])
+        if self._extent is not None and not np.any(np.isnan(self._extent)):
+            mins = np.minimum(mins, self._extent[0])
+            maxs = np.maximum(maxs, self._extent[1])
+        self._extent = np.vstack([mins, maxs])
 
     @property
     def shading(self):
@@ -181,7 +1219,7 @@ class Particles(Surface):
             self._tmp_rotvec0 = self.rotvec.copy() 
 
         self.rotvec = self._tmp_rotvec0 * (gamma-1)
-        self._update_billboard_filter()
+        self._update_billboard_filter(force=True)
         self.refresh()
 
     def _detach_filter(self):
@@ -192,6 +1230,20 @@ class Particles(Surface):
         for f in self.filter:
             self._visual.attach(f)
 
+    def _detach_billboard_filter(self):
+        """detaches the billboard filter and stops the per frame uploads (see `add_to_viewer`)"""
+        self._canvas.events.draw.disconnect((self, "_flush_billboard_update"))
+        self._billboard_update_pending = False
+        self._drawn_view = None
+        if self._billboard_filter._attached:
+            self._visual.detach(self._billboard_filter)
+
+    def _on_layer_removed(self, event):
+        if event.value is self:
+            self._viewer.layers.events.removed.disconnect(self._on_layer_removed)
+            self._detach_billboard_filter()
+            self._shutdown_keyframe_executor()
+
     def get_visual(self, viewer):
         # FIXME: access to qt_viewer will be removed in napari 0.5.0 
         with warnings.catch_warnings():
@@ -204,8 +1256,14 @@ class Particles(Surface):
         self._visual = self.get_visual(viewer)
 
         self._visual.attach(self._billboard_filter)
-        self._update_billboard_filter()
+        self._update_billboard_filter(force=True)
+        # pending view updates are uploaded right before the next frame is drawn (weakly referenced)
+        self._canvas = self._visual.canvas
+        self._canvas.events.draw.connect((self, "_flush_billboard_update"), position="first")
+        viewer.layers.events.removed.connect(self._on_layer_removed)
         self._attach_filter()
+        if self._slab_projection != "sum":
+            self._update_slab_projection()
 
         # update combobox
         try: 
@@ -218,4 +1276,208 @@ class Particles(Surface):
                 for k in _shader_functions.keys():
                     combo.addItem(k, k)
         except:
-            print('cannot populate combo box')
\ No newline at end of file
+            print('cannot populate combo box')
+
+
+def _subsample_to_budget(coords, size, sigmas, rotvec, values, colors, properties, max_bytes, max_particles, quantize=None):
+    """stratified subsampling of all particle arrays to stay within the budgets (keeping the total brightness)"""
+    coords = np.asarray(coords)
+    n = len(coords)
+    budget = n if max_particles is None else int(max_particles)
+    if max_bytes is not None:
+        usage = Particles.estimate_memory_usage(1, quantize=quantize is not None)
+        budget = min(budget, int(max_bytes) // (usage["host"] + usage["gpu"]))
+    if n <= budget:
+        return coords, size, sigmas, rotvec, values, colors, properties
+
+    warnings.warn(f"subsampling {n} to {budget} particles to stay within the memory budget")
+    index = stratified_subsample(coords, budget)
+
+    def _take(x, ndim=1):
+        # only per particle arrays (not broadcasted scalars or vectors)
+        x = np.asarray(x)
+        return x[index] if x.ndim >= ndim and len(x) == n else x
+
+    values = np.asarray(values, dtype=np.float64)
+    kept = _take(values)
+    # preserve the total brightness
+    total, total_kept = np.sum(np.broadcast_to(values, n)), np.sum(np.broadcast_to(kept, len(index)))
+    if total_kept != 0:
+        kept = kept * (total / total_kept)
+    properties = None if properties is None else {k: _take(v) for k, v in properties.items()}
+    if colors is not None and not isinstance(colors, str):
+        colors = _take(colors, 2)
+    return coords[index], _take(size), _take(sigmas, 2), _take(rotvec, 2), kept, colors, properties
+
+
+class MultiChannelParticles(Particles):
+    """Particle layer holding several channels in a single set of buffers
+
+    Each channel has its own colormap and contrast limits. This is realized by 
+    normalizing the values of channel c into the range [c, c+1) and rendering them 
+    with a single, stacked colormap. Channel visibility is toggled via the layer mask.
+    """
+
+    # fraction of every channel range that is kept free to avoid color bleeding between channels
+    _channel_gap = 1 / 32
+
+    def __init__(
+        self,
+        coords: np.ndarray,
+        channels: np.ndarray,
+        values: Union[float, np.ndarray] = 1,
+        colormaps: Sequence = ("bop blue", "bop orange", "magenta"),
+        channel_contrast_limits: Optional[Sequence[tuple]] = None,
+        **kwargs,
+    ):
+        """Creates a multi-channel particle layer
+
+        Parameters
+        ----------
+        coords : np.ndarray
+            the coordinates of the center of the particles, array of shape (N, 3) or (N, 2)
+        channels : np.ndarray
+            integer channel index (0,...,C-1) of each particle, array of shape (N,)
+        values : Union[float, np.ndarray], optional
+            values for each particle (used for determining the color within its channel), by default 1
+        colormaps : Sequence, optional
+            colormap for each channel, by default ("bop blue", "bop orange", "magenta")
+        channel_contrast_limits : Sequence[tuple], optional
+            contrast limits for each channel, by default the value range of each channel
+        **kwargs : 
+            passed to `Particles`
+        """
+        if kwargs.get("max_bytes") is not None or kwargs.get("max_particles") is not None:
+            raise NotImplementedError("particle budgets of multi-channel layers are not supported")
+        if kwargs.get("reorder") is not None:
+            raise NotImplementedError("reordering multi-channel layers is not supported")
+        channels = np.asarray(channels).astype(int)
+        if not channels.shape == (len(coords),):
+            raise ValueError(f"channels should be of shape ({len(coords)},)")
+        n_channels = int(channels.max()) + 1 if len(channels) > 0 else 1
+        if len(colormaps) < n_channels:
+            raise ValueError(f"need at least {n_channels} colormaps")
+
+        values = np.broadcast_to(np.asarray(values, dtype=np.float32), len(coords))
+
+        self._channels = channels
+        self._channel_values = values
+        self._channel_visible = np.ones(n_channels, dtype=bool)
+        if channel_contrast_limits is None:
+            channel_contrast_limits = self._channel_data_ranges()
+        self._channel_colormaps = tuple(ensure_colormap(c) for c in colormaps[:n_channels])
+        self._channel_contrast_limits = tuple(tuple(c) for c in channel_contrast_limits)
+
+        kwargs["colormap"] = self._stacked_colormap()
+        kwargs["contrast_limits"] = (0, n_channels)
+        super().__init__(coords, values=self._stacked_values(), **kwargs)
+
+    def set_particles(self, *args, **kwargs):
+        raise NotImplementedError("replacing the particles of a multi-channel layer is not supported")
+
+    @property
+    def n_channels(self) -> int:
+        return len(self._channel_visible)
+
+    def _channel_data_ranges(self) -> list:
+        """the value range of every channel"""
+        ranges = []
+        for c in range(self.n_channels):
+            v = self._channel_values[self._channels == c]
+            lo, hi = (float(np.min(v)), float(np.max(v))) if len(v) > 0 else (0, 1)
+            ranges.append((lo, hi if hi > lo else lo + 1))
+        return ranges
+
+    def set_local_density(self, radius: float, workers: Optional[int] = None) -> np.ndarray:
+        density = super().set_local_density(radius, workers=workers)
+        # the densities of every channel span its colormap
+        self.channel_contrast_limits = self._channel_data_ranges()
+        return density
+
+    def _stacked_values(self):
+        lims = np.asarray(self._channel_contrast_limits, dtype=np.float32)
+        lo, hi = lims[self._channels, 0], lims[self._channels, 1]
+        x = np.clip((self._channel_values - lo) / (hi - lo), 0, 1)
+        return self._channels + (1 - self._channel_gap) * x
+
+    def _stacked_colormap(self):
+        n = len(self._channel_colormaps)
+        x = np.linspace(0, 1, 256)
+        colors, controls = [], []
+        for c, cmap in enumerate(self._channel_colormaps):
+            colors.append(cmap.map(x))
+            # the same range [c, c+1-gap] as the stacked values
+            controls.append((c + (1 - self._channel_gap) * x) / n)
+        # the colormap has to end at 1 (which no stacked value reaches)
+        colors.append(colors[-1][-1:])
+        controls.append([1.0])
+        return Colormap(
+            colors=np.concatenate(colors),
+            controls=np.concatenate(controls),
+            name="_".join(cmap.name for cmap in self._channel_colormaps),
+        )
+
+    @property
+    def channel_colormaps(self) -> tuple:
+        """The colormaps of all channels"""
+        return self._channel_colormaps
+
+    @channel_colormaps.setter
+    def channel_colormaps(self, colormaps):
+        if len(colormaps) != self.n_channels:
+            raise ValueError(f"need exactly {self.n_channels} colormaps")
+        self._channel_colormaps = tuple(ensure_colormap(c) for c in colormaps)
+        self.colormap = self._stacked_colormap()
+
+    @property
+    def channel_contrast_limits(self) -> tuple:
+        """The contrast limits of all channels"""
+        return self._channel_contrast_limits
+
+    @channel_contrast_limits.setter
+    def channel_contrast_limits(self, contrast_limits):
+        if len(contrast_limits) != self.n_channels:
+            raise ValueError(f"need exactly {self.n_channels} contrast limits")
+        self._channel_contrast_limits = tuple(tuple(c) for c in contrast_limits)
+        self._set_vertex_values(self._stacked_values())
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._channel_values
+
+    @values.setter
+    def values(self, values: Union[float, np.ndarray]):
+        self._invalidate_statistics("values")
+        self._channel_values = np.broadcast_to(np.asarray(values, dtype=np.float32), len(self._coords))
+        self._set_vertex_values(self._stacked_values())
+
+    @property
+    def channel_visible(self) -> tuple:
+        """The visibility of all channels"""
+        return tuple(self._channel_visible)
+
+    @channel_visible.setter
+    def channel_visible(self, visible):
+        self._channel_visible[:] = visible
+        self._refresh_mask()
+
+    def _calc_data_range(self, mode="data"):
+        # the stacked colormap always spans all channels
+        return [0, self.n_channels]
+
+    def _attributes(self) -> dict:
+        attrs = super()._attributes()
+        attrs.update(values=self._channel_values, channels=self._channels)
+        return attrs
+
+    def set_channel_visible(self, channel: int, visible: bool = True):
+        self._channel_visible[channel] = visible
+        self._refresh_mask()
+
+    def _draw_mask(self):
+        if np.all(self._channel_visible):
+            return self._mask
+        mask = self._channel_visible[self._channels]
+        if self._mask is not None:
+            mask &= self._mask
+        return mask
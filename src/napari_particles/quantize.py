@@ -0,0 +1,170 @@
+"""
+Compact (quantized) storage of the per particle attributes
+
+Instead of the interleaved float32 layout with 4 rows per particle (`vertex_layout`), every
+particle is stored once with its position as int16 offset to the origin of its tile (of a
+uniform grid), its sigmas as float16 and its rotation (quaternion vector) as normalized int16,
+i.e. 22 instead of 192 bytes (the 4 vertex rows of 48 bytes). The drawn vertices are
+dequantized when they are gathered for the upload (see `BillboardsFilter.set_vertex_data`),
+with a positional error of at most half a quantization step per axis.
+
+"""
+
+from typing import Optional, Tuple
+import numpy as np
+from .billboards_filter import VERTEX_DTYPE, vertex_field
+from .utils import _parallel_chunks, billboard_template
+
+# one record per particle
+COMPACT_DTYPE = np.dtype(
+    [
+        ("tile", np.uint32),
+        ("center", np.int16, 3),
+        ("sigmas", np.float16, 3),
+        ("quatvec", np.int16, 3),
+    ]
+)
+
+# number of quantization steps per tile and axis
+_LEVELS = 2**16 - 1
+_UNIT = 2**15 - 1
+
+
+def quantize_positions(
+    coords: np.ndarray, tile_size: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Quantizes positions to int16 offsets relative to the origins of their (uniform grid) tiles
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        the positions, array of shape (N, D)
+    tile_size : float
+        the tile size (the same for all axes), the quantization step is tile_size/65535
+
+    Returns
+    -------
+    origins : np.ndarray
+        the origins of all occupied tiles, array of shape (T, D)
+    tiles : np.ndarray
+        the tile index of every position, array of shape (N,)
+    offsets : np.ndarray
+        the quantized offsets, int16 array of shape (N, D)
+    step : float
+        the quantization step
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    step = tile_size / _LEVELS
+    lo = np.min(coords, axis=0) if len(coords) > 0 else np.zeros(coords.shape[1])
+    keys = np.floor((coords - lo) / tile_size).astype(np.int64)
+    unique, tiles = np.unique(keys, axis=0, return_inverse=True)
+    tiles = tiles.ravel().astype(np.uint32)
+    origins = lo + unique * tile_size
+    offsets = np.clip(np.round((coords - origins[tiles]) / step), 0, _LEVELS) - (_LEVELS + 1) // 2
+    return origins, tiles, offsets.astype(np.int16), step
+
+
+def dequantize_positions(origins: np.ndarray, tiles: np.ndarray, offsets: np.ndarray, step: float) -> np.ndarray:
+    """The positions of quantized offsets (CPU reference of the dequantization, see `quantize_positions`)"""
+    return origins[tiles] + step * (offsets.astype(np.float64) + (_LEVELS + 1) // 2)
+
+
+def quantize_unit(x: np.ndarray) -> np.ndarray:
+    """Quantizes values in [-1, 1] to normalized int16"""
+    return np.round(np.clip(x, -1, 1) * _UNIT).astype(np.int16)
+
+
+def dequantize_unit(x: np.ndarray) -> np.ndarray:
+    """The values of normalized int16 (see `quantize_unit`)"""
+    return x.astype(np.float32) / _UNIT
+
+
+class QuantizedLayout:
+    """Compact per particle storage of centers, sigmas and rotations (used instead of `vertex_layout`)
+
+    Example
+    -------
+    >>> layout = QuantizedLayout(coords, sigmas, quatvec, scale, max_error=0.01)
+    >>> layout.max_error  # the actual maximal positional error
+    """
+
+    def __init__(
+        self,
+        coords: np.ndarray,
+        sigmas: np.ndarray,
+        quatvec: np.ndarray,
+        scale: np.ndarray,
+        max_error: float,
+    ):
+        """
+        Parameters
+        ----------
+        coords : np.ndarray
+            the particle centers, array of shape (N, 3)
+        sigmas : np.ndarray
+            the particle sigmas, array of shape (N, 3)
+        quatvec : np.ndarray
+            the vector part of the (unit) rotation quaternions, array of shape (N, 3)
+        scale : np.ndarray
+            the per particle quad scale, array of shape (N,) (referenced, not copied)
+        max_error : float
+            the allowed positional (euclidean) error, which determines the tile size
+        """
+        if not max_error > 0:
+            raise ValueError(f"max_error should be positive, not {max_error}")
+        coords = np.asarray(coords)
+        ndim = coords.shape[1]
+        # half a step per axis
+        tile_size = 2 * _LEVELS * max_error / np.sqrt(ndim)
+        self.origins, tiles, offsets, self.step = quantize_positions(coords, tile_size)
+        self.data = np.empty(len(coords), dtype=COMPACT_DTYPE)
+        self.data["tile"] = tiles
+        self.data["center"] = offsets
+        self.set_sigmas(sigmas)
+        self.set_quatvec(quatvec)
+        self.scale = scale
+        err = dequantize_positions(self.origins, tiles, offsets, self.step) - coords
+        self.max_error = float(np.sqrt(np.max(np.sum(err ** 2, axis=-1)))) if len(coords) > 0 else 0.0
+        self._texcoords = billboard_template(1)[1]
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.origins.nbytes
+
+    def set_sigmas(self, sigmas: np.ndarray):
+        self.data["sigmas"] = sigmas
+
+    def set_quatvec(self, quatvec: np.ndarray):
+        self.data["quatvec"] = quantize_unit(quatvec)
+
+    def dequantize(self, index: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns (centers, sigmas, quatvec) of the particles `index` (by default all) as floats"""
+        data = self.data if index is None else self.data[index]
+        centers = dequantize_positions(self.origins, data["tile"], data["center"], self.step)
+        quatvec = dequantize_unit(data["quatvec"])
+        # rounding must not push the vector part out of the unit ball (the shader computes w from its norm)
+        quatvec /= np.maximum(1, np.linalg.norm(quatvec, axis=-1, keepdims=True))
+        return centers, data["sigmas"].astype(np.float32), quatvec
+
+    def gather(self, index: np.ndarray, out: np.ndarray, workers: Optional[int] = 1):
+        """Writes the dequantized (VERTEX_DTYPE) rows of the mesh vertices `index` (4 per particle) into out"""
+        if not (out.dtype == VERTEX_DTYPE and len(out) == len(index)):
+            raise ValueError(f"out should be a VERTEX_DTYPE array of length {len(index)}")
+
+        def _fill(a, b):
+            particles = index[a:b] // 4
+            centers, sigmas, quatvec = self.dequantize(particles)
+            block = out[a:b]
+            vertex_field(block, "centercoords")[:] = centers
+            vertex_field(block, "sigmas")[:] = sigmas
+            vertex_field(block, "quatvec")[:] = quatvec
+            vertex_field(block, "texcoords")[:] = self._texcoords[index[a:b] % 4]
+            vertex_field(block, "scale")[:] = self.scale[particles]
+
+        _parallel_chunks(_fill, len(index), workers=workers)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(n={len(self)}, tiles={len(self.origins)}, max_error={self.max_error:.3g})"
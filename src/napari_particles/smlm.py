@@ -0,0 +1,237 @@
+"""
+Preprocessing of single molecule localization microscopy (SMLM) tables
+
+"""
+
+import os
+from itertools import repeat
+from typing import Optional, Sequence, Tuple, Union
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from .spatial import GridHash
+
+
+def merge_localizations(
+    coords: np.ndarray,
+    frames: np.ndarray,
+    sigmas: Union[float, np.ndarray] = 1,
+    values: Optional[np.ndarray] = None,
+    radius: float = 20,
+    max_gap: int = 1,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Merges repeated localizations of the same emitter (blinks) into single particles
+
+    Two localizations are linked if they are closer than `radius` and appear in different
+    frames that are at most `max_gap` dark frames apart. Linked localizations (and chains of them)
+    are merged by weighting their positions with their inverse variance.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        localization coordinates, array of shape (N, D)
+    frames : np.ndarray
+        frame of each localization, integer array of shape (N,)
+    sigmas : Union[float, np.ndarray], optional
+        localization uncertainty (per axis), broadcastable to (N, D), by default 1
+    values : np.ndarray, optional
+        per localization values (e.g. photon counts) that are summed up, by default None
+    radius : float, optional
+        maximal distance of linked localizations, by default 20
+    max_gap : int, optional
+        maximal number of dark frames between linked localizations, by default 1
+
+    Returns
+    -------
+    coords : np.ndarray
+        merged coordinates, array of shape (M, D)
+    sigmas : np.ndarray
+        uncertainty of the merged coordinates, array of shape (M, D)
+    values : np.ndarray
+        summed values (or the number of merged localizations if values is None), array of shape (M,)
+    labels : np.ndarray
+        index of the merged particle for every localization, array of shape (N,)
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    frames = np.asarray(frames).astype(np.int64)
+    n, ndim = coords.shape
+    sigmas = np.broadcast_to(np.asarray(sigmas, dtype=np.float64), (n, ndim))
+
+    if not frames.shape == (n,):
+        raise ValueError(f"frames should be of shape ({n},)")
+
+    # hash over space and time, such that all linkable localizations j of i
+    # are found in the neighbouring spatial cells of the same or next frame bin
+    grid = GridHash(
+        np.concatenate([coords, frames[:, np.newaxis]], axis=-1),
+        cell_size=(radius,) * ndim + (max_gap + 1,),
+    )
+    offsets = grid.offsets(((-1, 0, 1),) * ndim + ((0, 1),))
+
+    src, dst = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)]
+    for i, j in grid.query_pairs(offsets):
+        df = frames[j] - frames[i]
+        m = (df >= 1) & (df <= max_gap + 1)
+        i, j = i[m], j[m]
+        m = np.sum((coords[i] - coords[j]) ** 2, axis=-1) <= radius**2
+        src.append(i[m])
+        dst.append(j[m])
+    src, dst = np.concatenate(src), np.concatenate(dst)
+
+    graph = coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+    n_merged, labels = connected_components(graph, directed=False)
+
+    weights = 1 / sigmas**2
+    weights_sum = np.stack([np.bincount(labels, weights[:, k], n_merged) for k in range(ndim)], axis=-1)
+    merged = np.stack([np.bincount(labels, weights[:, k] * coords[:, k], n_merged) for k in range(ndim)], axis=-1)
+    merged /= weights_sum
+
+    if values is None:
+        values = np.bincount(labels, minlength=n_merged)
+    else:
+        values = np.bincount(labels, np.asarray(values, dtype=np.float64), n_merged)
+
+    return merged, 1 / np.sqrt(weights_sum), values, labels
+
+
+# on Windows a named shared memory block is freed when its last handle is closed, i.e. before
+# the parent process could attach to the block of a finished worker. The columns are pickled there instead
+_SHARED_MEMORY = os.name != "nt"
+
+
+def _read_columns(
+    fname: str, columns: Optional[Sequence[str]], kwargs: dict, shared: bool = True
+) -> Tuple[Union[str, np.ndarray], int, list]:
+    """parses a table (in a worker process) into a float32 block of shape (columns, rows)
+
+    The block is returned as the name of a shared memory block (if shared) or as array.
+    """
+    import pandas as pd
+    from multiprocessing import shared_memory
+
+    df = pd.read_csv(fname, usecols=columns, **kwargs)
+    if columns is None:
+        df = df.select_dtypes("number")
+    names = list(df.columns)
+    n = len(df)
+    if not shared:
+        return np.stack([df[c].to_numpy(np.float32) for c in names]).reshape((len(names), n)), n, names
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, 4 * n * len(names)))
+    x = None
+    try:
+        x = np.ndarray((len(names), n), dtype=np.float32, buffer=shm.buf)
+        for i, c in enumerate(names):
+            x[i] = df[c].to_numpy()
+    except BaseException:
+        # release the buffer before the block is removed
+        x = None
+        shm.close()
+        shm.unlink()
+        raise
+    x = None
+    shm.close()
+    return shm.name, n, names
+
+
+def load_localizations(
+    files: Union[str, Sequence[str]],
+    columns: Optional[Sequence[str]] = None,
+    channels: Optional[Sequence[int]] = None,
+    workers: Optional[int] = None,
+    **kwargs,
+) -> dict:
+    """Loads several localization tables concurrently into a single set of columns
+
+    Every file is parsed in its own process and handed back as a float32 shared memory
+    block (pickled on Windows), which is copied into the (preallocated) concatenated columns.
+
+    Parameters
+    ----------
+    files : Union[str, Sequence[str]]
+        the csv files or a glob pattern (matches are sorted)
+    columns : Sequence[str], optional
+        the columns to load, by default None (all numeric columns present in every file)
+    channels : Sequence[int], optional
+        the channel of every file (stored as column "channel"), by default None
+    workers : int, optional
+        number of processes, by default None (all cores)
+    **kwargs :
+        passed to pandas.read_csv (e.g. delimiter)
+
+    Returns
+    -------
+    table : dict
+        float32 arrays of shape (N,) for all columns and the index of the source file
+        of every row ("file"), the file order is that of `files`
+
+    Example
+    -------
+    >>> table = load_localizations("data/sample_*.csv", columns=["x [nm]", "y [nm]"])
+    """
+    import glob
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import resource_tracker, shared_memory
+
+    files = sorted(glob.glob(files)) if isinstance(files, str) else list(files)
+    if len(files) == 0:
+        raise ValueError("no files to load")
+    if channels is not None and len(channels) != len(files):
+        raise ValueError(f"channels should be given for all {len(files)} files")
+    columns = None if columns is None else list(columns)
+
+    # the workers have to share our resource tracker, otherwise their blocks are removed when they exit
+    resource_tracker.ensure_running()
+    results, error = [], None
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(_read_columns, *args)
+            for args in zip(files, repeat(columns), repeat(kwargs), repeat(_SHARED_MEMORY))
+        ]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                error = e if error is None else error
+
+    try:
+        if error is not None:
+            raise error
+        names = columns
+        if names is None:
+            common = set.intersection(*(set(r[2]) for r in results))
+            names = [c for c in results[0][2] if c in common]
+        if len(names) == 0:
+            raise ValueError("the files have no (numeric) columns in common")
+
+        counts = [n for _, n, _ in results]
+        total = sum(counts)
+        table = {c: np.empty(total, dtype=np.float32) for c in names}
+        table["file"] = np.repeat(np.arange(len(files), dtype=np.int32), counts)
+        if channels is not None:
+            table["channel"] = np.repeat(np.asarray(channels, dtype=np.int32), counts)
+
+        offset = 0
+        for block, n, cols in results:
+            if isinstance(block, str):
+                shm = shared_memory.SharedMemory(name=block)
+                x = np.ndarray((len(cols), n), dtype=np.float32, buffer=shm.buf)
+            else:
+                shm, x = None, block
+            for c in names:
+                table[c][offset:offset + n] = x[cols.index(c)]
+            del x
+            if shm is not None:
+                shm.close()
+            offset += n
+    finally:
+        for name, _, _ in results:
+            if not isinstance(name, str):
+                continue
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            except FileNotFoundError:
+                continue
+            shm.close()
+            shm.unlink()
+    return table
@@ -0,0 +1,136 @@
+"""
+Fast save/load of prepared particle layers
+
+A snapshot is a folder with a `meta.json` and one uncompressed `.npy` file per buffer,
+such that loading is a (copy-on-write) memory map of the already prepared buffers.
+
+"""
+
+import json
+import os
+import warnings
+import numpy as np
+from napari.utils.colormaps import Colormap
+from .filters import ShaderFilter, _shader_functions
+from .billboards_filter import vertex_field
+from .utils import billboard_template
+
+_META_FILE = "meta.json"
+_VERSION = 4
+# older versions that can still be loaded (without the saved settings)
+_COMPATIBLE_VERSIONS = (3, _VERSION)
+
+# snapshot buffer name -> layer attribute
+_BUFFERS = dict(
+    coords="_coords",
+    size="_size",
+    sigmas="_sigmas",
+    rotvec="_rotvec",
+    scale="_scale",
+    layout="_vertex_layout",
+    vertices="_vertices",
+    values="_vertex_values",
+)
+
+
+def save_snapshot(layer, path: str):
+    """Saves the prepared buffers (in their dtypes) and the display state of a `Particles` layer"""
+    from .particles import Particles
+
+    if type(layer) is not Particles:
+        raise NotImplementedError(f"snapshots of {type(layer).__name__} layers are not supported")
+    if not isinstance(layer._vertex_layout, np.ndarray):
+        raise NotImplementedError("snapshots of quantized layers are not supported")
+
+    os.makedirs(path, exist_ok=True)
+
+    arrays = {name: getattr(layer, attr) for name, attr in _BUFFERS.items()}
+    arrays.update({f"property_{k}": v for k, v in layer._properties.items()})
+    if layer._colors is not None:
+        arrays["colors"] = layer._colors
+    if layer._order is not None:
+        arrays["order"] = layer._order
+    for name, x in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(x))
+
+    filters = []
+    for f in layer.filter:
+        if isinstance(f, ShaderFilter) and isinstance(f.mode, str) and f.mode in _shader_functions:
+            filters.append(dict(mode=f.mode, distance_intensity_increase=f.distance_intensity_increase))
+        else:
+            warnings.warn(f"cannot save filter {f}")
+
+    colormap = layer.colormap
+    meta = dict(
+        version=_VERSION,
+        n=len(layer._coords),
+        arrays=list(arrays.keys()),
+        properties=list(layer._properties.keys()),
+        antialias=float(layer._antialias),
+        filters=filters,
+        # construction settings (see `Particles._init_settings`)
+        settings=dict(
+            reorder=layer._reorder,
+            slab_thickness=layer._slab_thickness,
+            slab_projection=layer._slab_projection,
+        ),
+        layer=dict(
+            name=layer.name,
+            colormap=dict(
+                name=colormap.name, colors=colormap.colors.tolist(), controls=np.asarray(colormap.controls).tolist()
+            ),
+            contrast_limits=list(map(float, layer.contrast_limits)),
+            opacity=float(layer.opacity),
+            blending=str(layer.blending),
+        ),
+    )
+    with open(os.path.join(path, _META_FILE), "w") as f:
+        json.dump(meta, f)
+
+
+def load_snapshot(path: str, mmap: bool = True, cls=None, **kwargs):
+    """Loads a snapshot saved with `save_snapshot` as `Particles` layer (see `Particles.load_snapshot`)"""
+    from .particles import Particles
+
+    cls = Particles if cls is None else cls
+
+    with open(os.path.join(path, _META_FILE)) as f:
+        meta = json.load(f)
+    if meta["version"] not in _COMPATIBLE_VERSIONS:
+        raise ValueError(f"unsupported snapshot version {meta['version']}")
+
+    mmap_mode = "c" if mmap else None
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in meta["arrays"]}
+
+    layer_kwargs = dict(meta["layer"])
+    layer_kwargs["colormap"] = Colormap(**layer_kwargs["colormap"])
+    layer_kwargs["shading"] = "none"
+    layer_kwargs["colors"] = arrays.get("colors")
+    layer_kwargs.update(kwargs)
+    antialias = layer_kwargs.pop("antialias", meta["antialias"])
+    filter = layer_kwargs.pop(
+        "filter",
+        tuple(ShaderFilter(f["mode"], distance_intensity_increase=f["distance_intensity_increase"]) for f in meta["filters"]),
+    )
+
+    settings = dict(meta.get("settings", {}))
+    if "order" in arrays:
+        settings.setdefault("reorder", "morton")
+    for k in ("slab_thickness", "slab_projection"):
+        if k in layer_kwargs:
+            settings[k] = layer_kwargs.pop(k)
+
+    layer = cls.__new__(cls)
+    layer._init_settings(**settings)
+    layer._new_dataset(arrays.get("order"))
+    for name, attr in _BUFFERS.items():
+        if name not in ("vertices", "values"):
+            setattr(layer, attr, arrays[name])
+    layer._centercoords = vertex_field(layer._vertex_layout, "centercoords")
+    layer._quatvec = vertex_field(layer._vertex_layout, "quatvec")
+    faces, texcoords = billboard_template(meta["n"])
+    layer._mytexcoords = texcoords
+    layer._properties = {k: arrays[f"property_{k}"] for k in meta["properties"]}
+    layer._dataset._data = (arrays["vertices"], faces, arrays["values"])
+    layer._init_layer(layer._dataset._data, filter, antialias, **layer_kwargs)
+    return layer
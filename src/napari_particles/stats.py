@@ -0,0 +1,95 @@
+"""
+Cached statistics of particle attributes
+
+min/max and approximate quantiles are computed once in a single streaming pass and
+can be updated incrementally when particles are added or changed.
+
+"""
+
+from typing import Optional, Union
+import numpy as np
+
+
+class QuantileSketch:
+    """Streaming approximate quantiles (a simplified KLL sketch)
+
+    Level l holds sorted items of weight 2**l, every level keeps at most k items.
+    Larger inputs are subsampled directly into the level that fits, such that updating
+    with n values costs a single sort of the chunk. The rank error is of order 1/k.
+    """
+
+    def __init__(self, x: Optional[np.ndarray] = None, k: int = 2048, seed: Optional[int] = 0):
+        self.k = int(k)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._levels = []
+        self._rng = np.random.default_rng(seed)
+        if x is not None:
+            self.update(x)
+
+    def update(self, x: np.ndarray, chunksize: int = 2**20):
+        """Adds the (finite) values of x"""
+        x = np.asarray(x).ravel()
+        if len(x) > chunksize:
+            for i in range(0, len(x), chunksize):
+                self.update(x[i:i + chunksize], chunksize=chunksize)
+            return
+        x = x.astype(np.float64, copy=False)
+        x = x[np.isfinite(x)]
+        if len(x) == 0:
+            return
+        self.count += len(x)
+        self.min = min(self.min, float(np.min(x)))
+        self.max = max(self.max, float(np.max(x)))
+        level = max(0, int(np.ceil(np.log2(len(x) / self.k))))
+        if level > 0:
+            step = 2 ** level
+            x = np.sort(x)[self._rng.integers(step)::step]
+        self._insert(level, x)
+
+    def merge(self, other: "QuantileSketch"):
+        """Adds all values summarized by another sketch"""
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for level, x in enumerate(other._levels):
+            if len(x) > 0:
+                self._insert(level, x)
+
+    def _insert(self, level: int, x: np.ndarray):
+        while len(self._levels) <= level:
+            self._levels.append(np.zeros(0))
+        x = np.concatenate([self._levels[level], x])
+        if len(x) > self.k:
+            # compaction: keep every other item (with random offset) at twice the weight
+            self._levels[level] = np.zeros(0)
+            self._insert(level + 1, np.sort(x)[self._rng.integers(2)::2])
+        else:
+            self._levels[level] = x
+
+    def quantile(self, q: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """Approximate q-th quantile(s) with q in [0, 1] (exact for q=0 and q=1)"""
+        q = np.asarray(q, dtype=np.float64)
+        if np.any((q < 0) | (q > 1)):
+            raise ValueError("quantiles should be in [0, 1]")
+        if self.count == 0:
+            return np.full(q.shape, np.nan)[()]
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(x), 2.0 ** l) for l, x in enumerate(self._levels)])
+        ind = np.argsort(items, kind="stable")
+        items, weights = items[ind], weights[ind]
+        # (midpoint) rank of every item
+        ranks = np.cumsum(weights) - 0.5 * weights
+        res = np.interp(q * np.sum(weights), ranks, items)
+        res = np.where(q == 0, self.min, np.where(q == 1, self.max, res))
+        return res[()]
+
+    def percentile(self, p: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """Approximate p-th percentile(s) with p in [0, 100]"""
+        return self.quantile(np.asarray(p, dtype=np.float64) / 100)
+
+
+def approx_percentile(x: np.ndarray, p: Union[float, np.ndarray], k: int = 2048) -> Union[float, np.ndarray]:
+    """Approximate p-th percentile(s) of x computed in a single streaming pass"""
+    return QuantileSketch(x, k=k).percentile(p)
@@ -0,0 +1,138 @@
+"""
+A fixed capacity particle system that can drive a particle layer over time
+
+"""
+
+from typing import Callable, Optional, Tuple, Union
+import numpy as np
+
+
+class ParticleSystem:
+    """Fixed capacity particle system with a vectorized (explicit Euler) integrator
+
+    Particles live in a ring buffer of `capacity` slots: emitting new particles
+    recycles the oldest slots, particles whose age exceeds their lifetime are dead
+    (and hidden when rendered). All updates happen in place.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        ndim: int = 3,
+        lifetime: float = 1.0,
+        gravity: Union[float, np.ndarray] = 0,
+        damping: float = 0,
+        forces: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None,
+    ):
+        """Creates an empty particle system
+
+        Parameters
+        ----------
+        capacity : int
+            the maximal number of (live) particles
+        ndim : int, optional
+            the dimension of the particle positions, by default 3
+        lifetime : float, optional
+            the default lifetime of emitted particles, by default 1.0
+        gravity : Union[float, np.ndarray], optional
+            constant acceleration of shape (ndim,), by default 0
+        damping : float, optional
+            velocity damping rate, by default 0
+        forces : Callable, optional
+            additional acceleration forces(positions, velocities) -> array of shape (capacity, ndim), by default None
+        """
+        self.capacity = int(capacity)
+        self.ndim = ndim
+        self.default_lifetime = lifetime
+        self.gravity = np.broadcast_to(np.asarray(gravity, dtype=np.float32), (ndim,))
+        self.damping = damping
+        self.forces = forces
+
+        self.positions = np.zeros((self.capacity, ndim), dtype=np.float32)
+        self.velocities = np.zeros((self.capacity, ndim), dtype=np.float32)
+        self.age = np.zeros(self.capacity, dtype=np.float32)
+        # all slots start dead
+        self.lifetime = np.zeros(self.capacity, dtype=np.float32)
+
+        self._tmp = np.empty((self.capacity, ndim), dtype=np.float32)
+        self._head = 0
+        self._dirty = (self.capacity, 0)
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Boolean array of shape (capacity,) of the live particles"""
+        return self.age < self.lifetime
+
+    def _mark_dirty(self, start: int, stop: int):
+        self._dirty = (min(self._dirty[0], start), max(self._dirty[1], stop))
+
+    def consume_dirty(self) -> Tuple[int, int]:
+        """Returns the slot range (start, stop) changed since the last call and resets it"""
+        start, stop = self._dirty
+        self._dirty = (self.capacity, 0)
+        return (start, stop) if start < stop else (0, 0)
+
+    def emit(
+        self,
+        positions: np.ndarray,
+        velocities: Union[float, np.ndarray] = 0,
+        lifetime: Optional[Union[float, np.ndarray]] = None,
+    ) -> np.ndarray:
+        """Emits new particles into the oldest slots of the ring buffer
+
+        Parameters
+        ----------
+        positions : np.ndarray
+            positions of the new particles, array of shape (M, ndim)
+        velocities : Union[float, np.ndarray], optional
+            initial velocities, broadcastable to (M, ndim), by default 0
+        lifetime : Union[float, np.ndarray], optional
+            lifetime of the new particles, by default the lifetime of the system
+
+        Returns
+        -------
+        np.ndarray
+            the slots of the emitted particles
+        """
+        positions = np.atleast_2d(positions)
+        m = len(positions)
+        if lifetime is None:
+            lifetime = self.default_lifetime
+        velocities = np.broadcast_to(velocities, (m, self.ndim))
+        lifetime = np.broadcast_to(lifetime, (m,))
+        if m > self.capacity:
+            # only the last emitted particles survive
+            m = self.capacity
+            positions, velocities, lifetime = positions[-m:], velocities[-m:], lifetime[-m:]
+
+        slots = (self._head + np.arange(m)) % self.capacity
+        self.positions[slots] = positions
+        self.velocities[slots] = velocities
+        self.lifetime[slots] = lifetime
+        self.age[slots] = 0
+        if m > 0:
+            if slots[0] <= slots[-1]:
+                self._mark_dirty(int(slots[0]), int(slots[-1]) + 1)
+            else:
+                self._mark_dirty(0, self.capacity)
+        self._head = (self._head + m) % self.capacity
+        return slots
+
+    def step(self, dt: float):
+        """Advances all particles by dt (in place)"""
+        alive = np.flatnonzero(self.alive)
+        if len(alive) == 0:
+            return
+        tmp = self._tmp
+        if self.forces is not None:
+            np.multiply(self.forces(self.positions, self.velocities), dt, out=tmp)
+            self.velocities += tmp
+        if np.any(self.gravity != 0):
+            self.velocities += dt * self.gravity
+        if self.damping != 0:
+            self.velocities *= max(0, 1 - self.damping * dt)
+        np.multiply(self.velocities, dt, out=tmp)
+        self.positions += tmp
+        self.age += dt
+        # particles that died in this step have to be hidden as well
+        self._mark_dirty(int(alive[0]), int(alive[-1]) + 1)
@@ -0,0 +1,324 @@
+"""
+Out-of-core particle datasets stored as compressed spatial tiles on disk
+
+A dataset is a folder with an `index.json` (tile keys, bounds, particle counts and files)
+and one compressed `.npz` chunk per tile and written part.
+
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Union
+import numpy as np
+from .particles import Particles
+
+_INDEX_FILE = "index.json"
+
+
+class TileWriter:
+    """Writes particles chunk by chunk into a tiled on-disk dataset
+
+    Example
+    -------
+    >>> with TileWriter('data.tiles', tile_size=1000) as writer:
+    >>>     for coords, values in chunks:
+    >>>         writer.add(coords, values=values)
+    """
+
+    def __init__(self, path: str, tile_size: Union[float, Sequence[float]], ndim: int = 3):
+        """
+        Parameters
+        ----------
+        path : str
+            the dataset folder (will be created)
+        tile_size : Union[float, Sequence[float]]
+            the size of the (uniform grid) tiles, per axis
+        ndim : int, optional
+            the dimension of the particle coordinates, by default 3
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.ndim = ndim
+        self.tile_size = np.broadcast_to(np.asarray(tile_size, dtype=np.float64), (ndim,))
+        self._tiles = {}
+        self._attributes = None
+        self._n_parts = 0
+
+    def add(self, coords: np.ndarray, **attributes):
+        """Adds particles (coords of shape (N, ndim) and per-particle attributes, e.g. size, values, sigmas)"""
+        coords = np.asarray(coords, dtype=np.float32)
+        n = len(coords)
+        if not coords.shape == (n, self.ndim):
+            raise ValueError(f"coords should be of shape (N,{self.ndim})")
+
+        for k, v in attributes.items():
+            v = np.asarray(v)
+            attributes[k] = np.full(n, v, dtype=np.float32) if v.ndim == 0 else v
+            if not len(attributes[k]) == n:
+                raise ValueError(f"attribute '{k}' should be of length {n}")
+
+        if self._attributes is None:
+            self._attributes = sorted(attributes.keys())
+        elif sorted(attributes.keys()) != self._attributes:
+            raise ValueError(f"attributes should be {self._attributes}")
+
+        if n == 0:
+            return
+
+        # pad the bounds by the particle size such that tiles are found whenever any particle is visible
+        pad = 0.5 * attributes["size"] if "size" in attributes else np.zeros(n)
+        pad = np.broadcast_to(np.reshape(pad, (n, -1)), (n, self.ndim))
+
+        keys = np.floor(coords / self.tile_size).astype(np.int64)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+
+        for t, key in enumerate(unique):
+            idx = order[bounds[t] : bounds[t + 1]]
+            key = tuple(int(k) for k in key)
+            fname = "tile_" + "_".join(map(str, key)) + f"_{self._n_parts}.npz"
+            np.savez_compressed(
+                os.path.join(self.path, fname), coords=coords[idx], **{k: v[idx] for k, v in attributes.items()}
+            )
+            entry = self._tiles.setdefault(
+                key, dict(count=0, lo=np.full(self.ndim, np.inf), hi=np.full(self.ndim, -np.inf), files=[])
+            )
+            entry["count"] += len(idx)
+            entry["lo"] = np.minimum(entry["lo"], np.min(coords[idx] - pad[idx], axis=0))
+            entry["hi"] = np.maximum(entry["hi"], np.max(coords[idx] + pad[idx], axis=0))
+            entry["files"].append(fname)
+
+        self._n_parts += 1
+
+    def close(self):
+        """Writes the index of the dataset"""
+        index = dict(
+            ndim=self.ndim,
+            tile_size=self.tile_size.tolist(),
+            attributes=self._attributes or [],
+            tiles=[
+                dict(key=list(key), count=t["count"], lo=t["lo"].tolist(), hi=t["hi"].tolist(), files=t["files"])
+                for key, t in self._tiles.items()
+            ],
+        )
+        with open(os.path.join(self.path, _INDEX_FILE), "w") as f:
+            json.dump(index, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_tiled(
+    path: str, coords: np.ndarray, tile_size: Union[float, Sequence[float]], chunksize: int = 10**7, **attributes
+):
+    """Writes the particles (coords and per-particle attributes) as tiled dataset, see TileWriter"""
+    coords = np.asarray(coords)
+    with TileWriter(path, tile_size=tile_size, ndim=coords.shape[1]) as writer:
+        for a in range(0, max(1, len(coords)), chunksize):
+            sl = slice(a, a + chunksize)
+            writer.add(coords[sl], **{k: v if np.ndim(v) == 0 else v[sl] for k, v in attributes.items()})
+
+
+class TiledDataset:
+    """A tiled on-disk particle dataset with a LRU tile cache and background prefetching"""
+
+    def __init__(self, path: str, cache_bytes: int = 2**30):
+        """
+        Parameters
+        ----------
+        path : str
+            the dataset folder (written with TileWriter/write_tiled)
+        cache_bytes : int, optional
+            the maximal size of the tile cache in bytes, by default 1GB
+        """
+        with open(os.path.join(path, _INDEX_FILE)) as f:
+            index = json.load(f)
+        self.path = path
+        self.ndim = index["ndim"]
+        self.tile_size = np.asarray(index["tile_size"])
+        self.attributes = tuple(index["attributes"])
+        tiles = index["tiles"]
+        self.keys = [tuple(t["key"]) for t in tiles]
+        self.counts = np.array([t["count"] for t in tiles], dtype=np.int64)
+        self.tile_bounds = np.array([(t["lo"], t["hi"]) for t in tiles], dtype=np.float64).reshape(
+            (len(tiles), 2, self.ndim)
+        )
+        self._files = [t["files"] for t in tiles]
+
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cache_nbytes = 0
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(1)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def bounds(self) -> np.ndarray:
+        """The bounds (2, ndim) of the whole dataset"""
+        if len(self) == 0:
+            return np.zeros((2, self.ndim))
+        return np.stack([self.tile_bounds[:, 0].min(axis=0), self.tile_bounds[:, 1].max(axis=0)])
+
+    def tiles_in_box(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """Indices of all tiles intersecting the box lo <= x <= hi"""
+        inside = (self.tile_bounds[:, 0] <= np.asarray(hi)) & (self.tile_bounds[:, 1] >= np.asarray(lo))
+        return np.flatnonzero(np.all(inside, axis=-1))
+
+    def _read(self, i: int) -> dict:
+        parts = [np.load(os.path.join(self.path, f)) for f in self._files[i]]
+        return {k: np.concatenate([p[k] for p in parts]) for k in ("coords",) + self.attributes}
+
+    def _insert(self, i: int, data: dict):
+        with self._lock:
+            if i in self._cache:
+                return
+            self._cache[i] = data
+            self._cache_nbytes += sum(v.nbytes for v in data.values())
+            # evict least recently used tiles (but always keep the newest one)
+            while self._cache_nbytes > self.cache_bytes and len(self._cache) > 1:
+                _, old = self._cache.popitem(last=False)
+                self._cache_nbytes -= sum(v.nbytes for v in old.values())
+
+    def load(self, i: int) -> dict:
+        """Returns the arrays of tile i (from the cache if possible)"""
+        with self._lock:
+            if i in self._cache:
+                self._cache.move_to_end(i)
+                return self._cache[i]
+            future = self._pending.get(i)
+        if future is not None:
+            return future.result()
+        data = self._read(i)
+        self._insert(i, data)
+        return data
+
+    def _prefetch(self, i: int) -> dict:
+        try:
+            data = self._read(i)
+            self._insert(i, data)
+            return data
+        finally:
+            with self._lock:
+                self._pending.pop(i, None)
+
+    def prefetch(self, indices: Sequence[int]):
+        """Loads the given tiles into the cache in a background thread"""
+        with self._lock:
+            for i in indices:
+                if i not in self._cache and i not in self._pending:
+                    self._pending[i] = self._executor.submit(self._prefetch, i)
+
+    def get(self, indices: Sequence[int]) -> dict:
+        """Returns the concatenated arrays ('coords' and all attributes) of the given tiles"""
+        tiles = [self.load(i) for i in indices]
+        if len(tiles) == 0:
+            return dict(coords=np.zeros((0, self.ndim), np.float32))
+        return {k: np.concatenate([t[k] for t in tiles]) for k in tiles[0].keys()}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class TiledParticles(Particles):
+    """Particle layer that only loads the tiles of a TiledDataset intersecting the current view
+
+    The visible region is estimated from the camera center/zoom and the canvas size
+    (exact for 2D views, a conservative box for 3D views) and the current dims slice.
+    Tiles around the visible region are prefetched in the background.
+    """
+
+    def __init__(
+        self,
+        dataset: Union[str, TiledDataset],
+        max_particles: int = 10**7,
+        prefetch_margin: float = 0.5,
+        **kwargs,
+    ):
+        """
+        Parameters
+        ----------
+        dataset : Union[str, TiledDataset]
+            the tiled dataset (or its path)
+        max_particles : int, optional
+            maximal number of simultaneously shown particles (tiles closest to the view center are kept), by default 10**7
+        prefetch_margin : float, optional
+            tiles within this fraction of the view size around the view are prefetched, by default 0.5
+        **kwargs :
+            passed to `Particles`
+        """
+        if not isinstance(dataset, TiledDataset):
+            dataset = TiledDataset(dataset)
+        self._tiled_dataset = dataset
+        self._max_particles = max_particles
+        self._prefetch_margin = prefetch_margin
+        self._visible_tiles = ()
+        kwargs.setdefault("contrast_limits", (0, 1))
+        super().__init__(np.zeros((0, 3)), **kwargs)
+
+    @property
+    def dataset(self) -> TiledDataset:
+        return self._tiled_dataset
+
+    @property
+    def _extent_data(self) -> np.ndarray:
+        bounds = self._tiled_dataset.bounds
+        if bounds.shape[1] == 2:
+            bounds = np.concatenate([np.zeros((2, 1)), bounds], axis=-1)
+        return bounds
+
+    def _view_box(self):
+        """the (approximate) visible box (lo, hi) in data coordinates"""
+        viewer = self._viewer
+        ndisplay = viewer.dims.ndisplay
+        offset = viewer.dims.ndim - self.ndim
+        point = np.asarray(viewer.dims.point, dtype=np.float64)[offset:]
+        lo, hi = point - 0.5, point + 0.5
+        half = 0.5 * max(self._visual.canvas.size) / viewer.camera.zoom
+        center = np.asarray(viewer.camera.center)[-ndisplay:]
+        for d, c in zip(viewer.dims.displayed[-ndisplay:], center):
+            lo[d - offset], hi[d - offset] = c - half, c + half
+        if self._tiled_dataset.ndim == 2:
+            lo, hi = lo[1:], hi[1:]
+        return lo, hi
+
+    def _update_tiles(self, event=None):
+        dataset = self._tiled_dataset
+        lo, hi = self._view_box()
+        tiles = dataset.tiles_in_box(lo, hi)
+
+        counts = dataset.counts[tiles]
+        if counts.sum() > self._max_particles:
+            centers = dataset.tile_bounds[tiles].mean(axis=1)
+            order = np.argsort(np.linalg.norm(centers - 0.5 * (lo + hi), axis=-1))
+            keep = order[np.cumsum(counts[order]) <= self._max_particles]
+            tiles = np.sort(tiles[keep])
+
+        tiles = tuple(int(t) for t in tiles)
+        if tiles != self._visible_tiles:
+            self._visible_tiles = tiles
+            data = dataset.get(tiles)
+            kwargs = {k: data.pop(k) for k in ("size", "sigmas", "rotvec", "values") if k in data}
+            coords = data.pop("coords")
+            self.set_particles(coords, properties=data, **kwargs)
+
+        margin = self._prefetch_margin * (hi - lo)
+        dataset.prefetch(dataset.tiles_in_box(lo - margin, hi + margin))
+
+    def add_to_viewer(self, viewer, **kwargs):
+        super().add_to_viewer(viewer, **kwargs)
+        viewer.camera.events.center.connect(self._update_tiles)
+        viewer.camera.events.zoom.connect(self._update_tiles)
+        viewer.dims.events.current_step.connect(self._update_tiles)
+        viewer.dims.events.ndisplay.connect(self._update_tiles)
+        self._update_tiles()
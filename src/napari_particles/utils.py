@@ -1,11 +1,103 @@
-from typing import Tuple, Union
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, Union
 import numpy as np
 
-from scipy.spatial.transform import Rotation
 
-def generate_billboards_2d(coords: np.ndarray, size: Union[float, np.ndarray] =20) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+def _parallel_chunks(func: Callable[[int, int], None], n: int, workers: Optional[int] = 1, chunksize: int = 2**16):
+    """
+    Calls func(start, stop) on disjoint chunks covering range(n), using a thread pool if workers>1 (or None for all cores)
+    func is expected to write into preallocated output arrays (numpy releases the GIL for most operations)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or n <= chunksize:
+        func(0, n)
+        return
+    n_chunks = max(workers, int(np.ceil(n / chunksize)))
+    bounds = np.linspace(0, n, n_chunks + 1).astype(int)
+    with ThreadPoolExecutor(workers) as executor:
+        # list() to propagate exceptions from the workers
+        list(executor.map(lambda ab: func(*ab), zip(bounds[:-1], bounds[1:])))
+
+
+def repeat_rows(
+    x: np.ndarray, repeats: int = 4, workers: Optional[int] = 1, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Same as np.repeat(x, repeats, axis=0), filled chunk-wise with the given number of workers 
+    (written into out if given)
+    """
+    x = np.asarray(x)
+    if out is None:
+        out = np.empty((repeats * len(x),) + x.shape[1:], dtype=x.dtype)
+
+    def _fill(a, b):
+        out[repeats * a : repeats * b] = np.repeat(x[a:b], repeats, axis=0)
+
+    _parallel_chunks(_fill, len(x), workers=workers)
+    return out
+
+
+# faces/texcoords of the largest number of billboards generated so far, smaller 
+# requests are served as read-only prefix views (see billboard_template)
+TEMPLATE_CACHE_BYTES = 2**30
+_template_cache = dict(faces=None, texcoords=None)
+_template_lock = threading.Lock()
+
+_texcoords0 = np.array([[0, 0],
+                        [1, 0],
+                        [1, 1],
+                        [0, 1]]).astype(np.float32)
+
+_faces0 = np.array([[0,1,2],[0,3,2]])
+
+
+def _generate_template(n: int, workers: Optional[int] = 1) -> Tuple[np.ndarray, np.ndarray]:
+    texcoords = np.empty((4 * n, 2), dtype=_texcoords0.dtype)
+    faces = np.empty((2 * n, 3), dtype=_faces0.dtype)
+
+    def _fill(a, b):
+        texcoords[4*a:4*b] = np.tile(_texcoords0, (b-a, 1))
+        faces[2*a:2*b] = np.tile(_faces0, (b-a, 1)) + np.repeat(4*np.arange(a, b)[:, np.newaxis], 2, axis=0)
+
+    _parallel_chunks(_fill, n, workers=workers)
+    return faces, texcoords
+
+
+def billboard_template(n: int, workers: Optional[int] = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (faces, texture coordinates) of <n> billboards as read-only views into a module-level cache
+
+    The cache grows geometrically and is bypassed (and dropped) if <n> billboards would exceed TEMPLATE_CACHE_BYTES
+    """
+    # 2 faces and 4 texture coordinates per billboard
+    bytes_per_billboard = _faces0.nbytes + _texcoords0.nbytes
+    with _template_lock:
+        faces, texcoords = _template_cache["faces"], _template_cache["texcoords"]
+        n_cached = 0 if faces is None else len(faces) // 2
+        # an empty cache is seeded as well (with an empty template for n=0)
+        if faces is None or n > n_cached:
+            n_new = min(max(n, 2 * n_cached), TEMPLATE_CACHE_BYTES // bytes_per_billboard)
+            if n_new < n:
+                _template_cache.update(faces=None, texcoords=None)
+                faces, texcoords = _generate_template(n, workers=workers)
+                faces.flags.writeable = False
+                texcoords.flags.writeable = False
+                return faces, texcoords
+            faces, texcoords = _generate_template(n_new, workers=workers)
+            faces.flags.writeable = False
+            texcoords.flags.writeable = False
+            _template_cache.update(faces=faces, texcoords=texcoords)
+    return faces[:2*n], texcoords[:4*n]
+
+
+def generate_billboards_2d(coords: np.ndarray, size: Union[float, np.ndarray] =20, workers: Optional[int] = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Returns (vertices, faces, texture coordinates) of a <n> standard 2D billboards of given size(s) 
+    The arrays are filled chunk-wise with the given number of workers (None for all cores), 
+    faces and texture coordinates are read-only views from the template cache
     """
     verts0 = np.array([[-0.5, -0.5],
                        [0.5,  -0.5],
@@ -21,31 +113,62 @@ def generate_billboards_2d(coords: np.ndarray, size: Union[float, np.ndarray] =2
 
     assert len(size)==n and size.ndim==1
 
-    verts = size[:,np.newaxis, np.newaxis]*verts0[np.newaxis]
-    verts = verts.reshape((-1,verts.shape[-1]))
-
     # add time/z dimensions if present
-    
-    if coords.shape[1]>2:
-        coords = np.repeat(coords, 4, axis=0) 
-        verts = np.concatenate([coords[:,:-2], verts], axis=-1)
-        
-
-    texcoords0 = np.array([[0, 0],
-                           [1, 0],
-                           [1, 1],
-                           [0, 1]]).astype(np.float32)
-    
-    texcoords = np.tile(texcoords0,(n,1))
-    
-    faces = np.tile(np.array([[0,1,2],[0,3,2]]),(n,1))
-    faces = faces+np.repeat(np.repeat(4*np.arange(n)[:,np.newaxis],3,axis=-1),2 ,axis=0)
+    ndim = max(coords.shape[1], 2)
+    if ndim > 2:
+        dtype = np.result_type(coords.dtype, size.dtype, verts0.dtype)
+    else:
+        dtype = np.result_type(size.dtype, verts0.dtype)
+
+    verts = np.empty((4 * n, ndim), dtype=dtype)
+
+    def _fill(a, b):
+        verts[4*a:4*b, -2:] = (size[a:b, np.newaxis, np.newaxis]*verts0[np.newaxis]).reshape((-1, 2))
+        if ndim > 2:
+            verts[4*a:4*b, :-2] = np.repeat(coords[a:b, :-2], 4, axis=0)
+
+    _parallel_chunks(_fill, n, workers=workers)
+    faces, texcoords = billboard_template(n, workers=workers)
     return verts, faces, texcoords
 
 
+def pack_rgba8(colors, n: int) -> np.ndarray:
+    """
+    Returns <n> RGBA colors packed as uint8 (array of shape (n, 4))
+    colors can be a single color or one per row, given as color names, RGB(A) floats in [0, 1] or uint8
+    """
+    colors = np.asarray(colors)
+    if colors.dtype.kind in "UO":
+        from napari.utils.colormaps.standardize_color import transform_color
+
+        colors = transform_color(colors.ravel().tolist())
+    if colors.ndim == 1:
+        colors = colors[np.newaxis]
+    if not (colors.ndim == 2 and colors.shape[1] in (3, 4) and len(colors) in (1, n)):
+        raise ValueError(f"colors should be a single color or of shape ({n}, 3) or ({n}, 4)")
+    if colors.dtype != np.uint8:
+        colors = np.round(255 * np.clip(colors.astype(np.float32), 0, 1)).astype(np.uint8)
+    if colors.shape[1] == 3:
+        colors = np.concatenate([colors, np.full((len(colors), 1), 255, dtype=np.uint8)], axis=-1)
+    return np.ascontiguousarray(np.broadcast_to(colors, (n, 4)))
+
+
+def rgba8_to_vec2(colors: np.ndarray) -> np.ndarray:
+    """
+    Packs uint8 RGBA colors of shape (n, 4) into float32 pairs (256*r+g, 256*b+a) of shape (n, 2)
+    The pairs are exact integers (decoded by the billboard vertex shader), such that a color
+    only takes 8 bytes per drawn vertex (instead of 16 for a float vec4)
+    """
+    colors = np.asarray(colors, dtype=np.uint8)
+    out = np.multiply(colors[:, 0::2], np.float32(256), dtype=np.float32)
+    out += colors[:, 1::2]
+    return out
+
 
 def unit_quat_random(n:int) -> np.ndarray:
     """generate array of random unit quaternions representing rotations (only spatial part)"""
+    from scipy.spatial.transform import Rotation
+
     # q = np.random.normal(0,1,(n,4))
     # q = q/np.linalg.norm(q, axis=-1, keepdims=True)
     q = Rotation.random(n).as_quat()
@@ -56,6 +179,8 @@ def _unit_quat_3to4(p: np.ndarray) -> np.ndarray:
     return np.concatenate((w,p), axis=-1)
 
 def unit_quat_scale(p: np.ndarray, scale: float = 1) -> np.ndarray:
+    from scipy.spatial.transform import Rotation
+
     pp = Rotation.from_quat(_unit_quat_3to4(p))
     qq = Rotation.from_quat(_unit_quat_3to4(q))
     r = Rotation.concatenate((pp,qq)).as_quat()
@@ -63,14 +188,27 @@ def unit_quat_scale(p: np.ndarray, scale: float = 1) -> np.ndarray:
 
 
 def unit_quat_multiply(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    from scipy.spatial.transform import Rotation
+
     pp = Rotation.from_quat(_unit_quat_3to4(p))
     qq = Rotation.from_quat(_unit_quat_3to4(q))
     r = Rotation.concatenate((pp,qq)).as_quat()
     return r[:,1:]
 
 
-def rotvec_to_quatvec(p: np.ndarray):
-    return Rotation.from_rotvec(p).as_quat()[:,1:]
+def rotvec_to_quatvec(p: np.ndarray, workers: Optional[int] = 1, out: Optional[np.ndarray] = None) -> np.ndarray:
+    from scipy.spatial.transform import Rotation
+
+    p = np.asarray(p)
+    if out is None:
+        out = np.empty((len(p), 3), dtype=np.float64)
+
+    def _fill(a, b):
+        if b > a:
+            out[a:b] = Rotation.from_rotvec(p[a:b]).as_quat()[:,1:]
+
+    _parallel_chunks(_fill, len(p), workers=workers)
+    return out
 
 
 # def unit_quaternion_multiply(p: np.ndarray, q: np.ndarray) -> np.ndarray: